@@ -1,14 +1,20 @@
 # actuator.py
 
+import atexit     # For releasing the pooled actuators at program exit
+import logging    # For logging actuator state changes
+import threading  # For protecting the actuator pool from concurrent access
 import time  # Import the time module to allow for delays (e.g., using time.sleep)
 
+# Create a logger object specific to this module for logging messages.
+logger = logging.getLogger(__name__)
+
 class Actuator:
     """
     A class to control an actuator (such as a light or pump) using a Raspberry Pi's GPIO pins.
 
     This class supports two modes of operation:
       - Simulation mode (simulate=True): Instead of controlling real hardware,
-        the actions are printed to the console. This is useful for testing.
+        the actions are only logged. This is useful for testing.
       - Real mode (simulate=False): Uses the RPi.GPIO library to control actual hardware
         connected to the Raspberry Pi.
 
@@ -16,7 +22,7 @@ class Actuator:
       - pin (int): The GPIO pin number on the Raspberry Pi that controls this actuator.
       - name (str): A human-readable name for the actuator (e.g., "Light" or "Pump").
       - simulate (bool): A flag to determine if the actuator should run in simulation mode.
-                         If True, only messages are printed; if False, actual GPIO operations are performed.
+                         If True, only messages are logged; if False, actual GPIO operations are performed.
     """
     
     def __init__(self, pin, name="Actuator", simulate=True):
@@ -43,50 +49,101 @@ class Actuator:
         """
         Turn the actuator on.
         
-        In simulation mode, this function prints a message to the console.
+        In simulation mode, this function logs a message.
         In real mode, it sets the GPIO pin to HIGH (i.e., supplies voltage) to turn the actuator on.
         """
         if self.simulate:
-            # In simulation mode, print a message indicating that the actuator has been turned on.
-            print(f"{self.name} on pin {self.pin} turned ON.")
+            # In simulation mode, log a message indicating that the actuator has been turned on.
+            logger.info("%s on pin %s turned ON.", self.name, self.pin)
         else:
             # In real mode, set the GPIO pin to HIGH to turn the actuator on.
             self.GPIO.output(self.pin, self.GPIO.HIGH)
-            print(f"{self.name} on pin {self.pin} turned ON (GPIO).")
+            logger.info("%s on pin %s turned ON (GPIO).", self.name, self.pin)
 
     def turn_off(self):
         """
         Turn the actuator off.
         
-        In simulation mode, this function prints a message to the console.
+        In simulation mode, this function logs a message.
         In real mode, it sets the GPIO pin to LOW (i.e., no voltage) to turn the actuator off.
         """
         if self.simulate:
-            # In simulation mode, print a message indicating that the actuator has been turned off.
-            print(f"{self.name} on pin {self.pin} turned OFF.")
+            # In simulation mode, log a message indicating that the actuator has been turned off.
+            logger.info("%s on pin %s turned OFF.", self.name, self.pin)
         else:
             # In real mode, set the GPIO pin to LOW to turn the actuator off.
             self.GPIO.output(self.pin, self.GPIO.LOW)
-            print(f"{self.name} on pin {self.pin} turned OFF (GPIO).")
+            logger.info("%s on pin %s turned OFF (GPIO).", self.name, self.pin)
 
     def cleanup(self):
         """
         Clean up GPIO settings.
         
-        In simulation mode, this function simply prints a message.
-        In real mode, it calls the GPIO.cleanup() method to reset the GPIO pins,
+        In simulation mode, this function simply logs a message.
+        In real mode, it calls the GPIO.cleanup() method to reset this actuator's GPIO pin,
         which is important to avoid issues on subsequent runs.
         """
         if self.simulate:
-            # Print a message in simulation mode.
-            print("Cleanup called (simulation mode).")
+            # Log a message in simulation mode.
+            logger.debug("Cleanup called (simulation mode).")
         else:
-            # In real mode, call the cleanup function to free the GPIO resources.
-            self.GPIO.cleanup()
+            # In real mode, free only this actuator's pin. Pooled actuators are cleaned up one
+            # after another at exit, and a bare GPIO.cleanup() would reset every pin at once.
+            self.GPIO.cleanup(self.pin)
+
+# ---------------------------
+# Actuator Pool
+# ---------------------------
+# ACTUATORS keeps one long-lived Actuator per GPIO pin for the life of the process.
+# Creating an Actuator for real hardware runs GPIO.setup() and drives the pin LOW, so building
+# a new one for every on/off change would repeat the setup and briefly switch the device off.
+# The pins are released once, when the process exits (see cleanup_actuators()).
+# The scheduler and the web server's request threads both use the pool, so it is guarded by a lock.
+ACTUATORS = {}
+ACTUATORS_LOCK = threading.Lock()
+
+def get_actuator(pin, name, simulate):
+    """
+    Returns the pooled Actuator for the given GPIO pin, creating it on first use.
+
+    The actuator is rebuilt only if the device's simulation flag has changed since it was created;
+    the old one is cleaned up first, so a real pin is released before it is set up again.
+
+    Parameters:
+      pin (int): The GPIO pin number that controls the device.
+      name (str): The device name (used in log messages).
+      simulate (bool): Whether the device runs in simulation mode.
+
+    Returns:
+      Actuator: The actuator instance for this pin.
+    """
+    with ACTUATORS_LOCK:
+        actuator = ACTUATORS.get(pin)
+        if actuator is None or actuator.simulate != simulate:
+            if actuator is not None:
+                actuator.cleanup()
+            actuator = Actuator(pin, name, simulate=simulate)
+            ACTUATORS[pin] = actuator
+        # Keep the name current in case the device was renamed.
+        actuator.name = name
+        return actuator
+
+def cleanup_actuators():
+    """
+    Releases the GPIO resources of every pooled actuator. Registered to run at program exit.
+    """
+    with ACTUATORS_LOCK:
+        for actuator in ACTUATORS.values():
+            actuator.cleanup()
+        ACTUATORS.clear()
+
+atexit.register(cleanup_actuators)
 
 # The following block of code will only run when this script is executed directly.
 # It is not executed if the module is imported elsewhere.
 if __name__ == "__main__":
+    # Show the actuator's log messages on the console.
+    logging.basicConfig(level=logging.DEBUG)
     # Create an instance of Actuator for testing.
     # Here, we simulate an actuator (for example, a light) connected to GPIO pin 18.
     light = Actuator(pin=18, name="Light", simulate=True)
@@ -11,27 +11,32 @@ JWT-based authentication is used to secure these endpoints.
 """
 
 # Import standard and third-party modules
-import json
+import logging  # For logging request, sensor and Socket.IO messages
 import threading
 import time
-from datetime import datetime, timedelta  # For handling dates and times
 from flask import Flask, request, jsonify, render_template  # For creating a web app and handling HTTP requests/responses
 from auth import generate_token, token_required  # For generating JWT tokens and protecting routes with token verification
-from sensor import sensor_factory  # Factory function to create sensor instances based on configuration
-from actuator import Actuator  # Class to control actuators (or simulate them)
+from sensor import get_parsed_config, get_sensor  # Cached sensor configurations and sensor instances
+from actuator import get_actuator  # Returns the pooled actuator (GPIO controller) for a pin
+from sqlalchemy import select, bindparam  # For building the prebuilt lookup queries
 from database import Session, User, SensorLog, DeviceControl, SensorConfig, ControllerConfig
 # Explanation:
-# - Session: SQLAlchemy session factory to interact with the database.
+# - Session: SQLAlchemy session factory (one session per thread) to interact with the database.
 # - User: Model representing user authentication data.
 # - SensorLog: Model to log sensor readings.
 # - DeviceControl: Model to store settings for actuators (devices).
 # - SensorConfig: Model with configuration details for sensors.
 # - ControllerConfig: Model with rules linking sensors to actuators.
 from werkzeug.security import check_password_hash  # To verify hashed passwords during login
-from zoneinfo import ZoneInfo  # For working with time zones (used in timestamps)
 from flask_socketio import SocketIO  # For real-time communication
 import ffmpeg_controller  # Import FFmpeg controller functions
 
+# Create a logger object specific to this module.
+# Routine messages (every sensor read, heartbeat and connection count) are logged at DEBUG level,
+# state changes at INFO and problems at WARNING. Unlike print(..., flush=True), nothing is
+# formatted or written for levels that are switched off, and a handler decides how output is buffered.
+logger = logging.getLogger(__name__)
+
 # Create a Flask application instance.
 # The 'static_folder' parameter tells Flask where to look for static files (CSS, JS, images, etc.).
 app = Flask(__name__, static_folder='static')
@@ -62,6 +67,25 @@ debounce_timer = None
 # Global dictionary to store the last heartbeat time per sid.
 heartbeat_times = {}
 
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    """
+    Discards the database session of the current thread after each request.
+
+    Session is a scoped_session (one session per thread), so this makes sure a request thread
+    never carries a session, or its loaded objects, over into the next request.
+    """
+    Session.remove()
+
+# -------------------------
+# Prebuilt Queries
+# -------------------------
+# The queries that look up one device or one sensor configuration by its name, built once at import time.
+# Several endpoints run these lookups; reusing the same statement object (with the name passed as
+# the "n" parameter) lets SQLAlchemy reuse its compiled SQL instead of rebuilding the query each call.
+DEVICE_BY_NAME_STMT = select(DeviceControl).where(DeviceControl.device_name == bindparam("n"))
+SENSOR_BY_NAME_STMT = select(SensorConfig).where(SensorConfig.sensor_name == bindparam("n"))
+
 # -------------------------
 # Authentication Endpoint
 # -------------------------
@@ -114,22 +138,22 @@ def public_status():
         sensor_readings = {}
         for sensor in sensor_configs:
             try:
-                # Parse configuration, or use an empty dict if not provided.
-                config = json.loads(sensor.config_json) if sensor.config_json else {}
+                # Parsed configuration (cached between requests), or an empty one if not provided.
+                config = get_parsed_config(sensor)
                 # Log which sensor we're reading, along with its configuration.
-                print(f"[Public Status] Reading sensor: {sensor.sensor_name} (type: {sensor.sensor_type}) with config: {config}", flush=True)
+                logger.debug("[Public Status] Reading sensor: %s (type: %s) with config: %s", sensor.sensor_name, sensor.sensor_type, config)
                 
-                # Create the sensor instance (simulate will be True for simulation)
-                sensor_instance = sensor_factory(sensor.sensor_type, config, simulate=sensor.simulate)
+                # Get the sensor instance (created once and reused between requests).
+                sensor_instance = get_sensor(sensor)
                 # Read the sensor value.
                 value = sensor_instance.read_value()
-                print(f"[Public Status] Sensor '{sensor.sensor_name}' reading: {value}", flush=True)
+                logger.debug("[Public Status] Sensor '%s' reading: %s", sensor.sensor_name, value)
                 if isinstance(value, dict):
                   sensor_readings[f"{sensor.sensor_name}"]  = value["temperature"]
                 else:
                   sensor_readings[sensor.sensor_name] = value
             except Exception as e:
-                print(f"[Public Status] Error reading sensor '{sensor.sensor_name}': {e}", flush=True)
+                logger.warning("[Public Status] Error reading sensor '%s': %s", sensor.sensor_name, e)
                 sensor_readings[sensor.sensor_name] = None
         data['sensors'] = sensor_readings
 
@@ -166,10 +190,12 @@ def sensor_logs(current_user):
     """
     sensor_filter = request.args.get('type')  # Get the sensor type filter from the URL query parameters
     with Session() as session:
-        # Query SensorLog entries for the given sensor type and order them by timestamp (oldest first)
-        logs = session.query(SensorLog).filter(SensorLog.sensor_type == sensor_filter).order_by(SensorLog.timestamp.asc()).all()
+        # Query SensorLog entries for the given sensor type and order them by timestamp (oldest first).
+        # A chart can hold tens of thousands of readings, so only the two needed columns are fetched,
+        # as plain (timestamp, value) rows instead of full SensorLog objects.
+        logs = session.query(SensorLog.timestamp, SensorLog.value).filter(SensorLog.sensor_type == sensor_filter).order_by(SensorLog.timestamp.asc()).all()
         # Build a list of dictionaries representing each log entry and return as JSON
-        return jsonify([{'timestamp': log.timestamp.isoformat(), 'value': log.value} for log in logs])
+        return jsonify([{'timestamp': timestamp.isoformat(), 'value': value} for timestamp, value in logs])
 
 @app.route('/api/sensors', methods=['GET'])
 @token_required
@@ -179,7 +205,7 @@ def get_all_sensor_data(current_user):
     
     Process:
       1. Retrieve all sensor configurations from the database.
-      2. For each sensor, create a sensor instance using sensor_factory.
+      2. For each sensor, get its (cached) sensor instance.
       3. Read the sensor value by calling read_value().
       4. Store the reading in a dictionary mapping sensor names to their readings.
       5. Return the dictionary as a JSON response.
@@ -190,26 +216,18 @@ def get_all_sensor_data(current_user):
         sensor_configs = session.query(SensorConfig).all()
     for sensor_conf in sensor_configs:
         sensor_name = sensor_conf.sensor_name  # Unique identifier for the sensor
-        sensor_type = sensor_conf.sensor_type  # Type of sensor (e.g., "temperature")
-        config = {}
-        if sensor_conf.config_json:
-            try:
-                # Parse any extra configuration from the config_json field
-                import json
-                config = json.loads(sensor_conf.config_json)
-            except Exception as e:
-                print(f"Error parsing JSON for {sensor_name}: {e}")
         try:
-            # Create a sensor instance using the factory function
-            sensor = sensor_factory(sensor_type, config, simulate=sensor_conf.simulate)
+            # Get the sensor instance (created once from its configuration and reused between requests).
+            # An invalid config_json raises here and is reported like any other read error.
+            sensor = get_sensor(sensor_conf)
             # Read the sensor's current value
             value = sensor.read_value()
             # Save the sensor reading in the dictionary
             readings[sensor_name] = value
         except Exception as e:
-            # If an error occurs, save None as the sensor reading and print an error message
+            # If an error occurs, save None as the sensor reading and log an error message
             readings[sensor_name] = None
-            print(f"Error reading sensor '{sensor_name}': {e}")
+            logger.warning("Error reading sensor '%s': %s", sensor_name, e)
     # Return all sensor readings as a JSON response
     return jsonify(readings)
 
@@ -287,12 +305,12 @@ def toggle_control(current_user, device_name):
       2. Check if the device exists and is in manual mode.
       3. Toggle its current_status (if on, turn off; if off, turn on).
       4. Commit the change to the database.
-      5. If the device has a GPIO pin set, create an Actuator instance using its simulation flag
+      5. If the device has a GPIO pin set, get the pooled actuator for that pin (using its simulation flag)
          and call turn_on() or turn_off() accordingly.
       6. Return the updated device status as a JSON response.
     """
     with Session() as session:
-        control = session.query(DeviceControl).filter_by(device_name=device_name).first()
+        control = session.execute(DEVICE_BY_NAME_STMT, {"n": device_name}).scalar_one_or_none()
         if not control:
             return jsonify({'message': 'Device not found'}), 404
         if control.mode != 'manual':
@@ -303,8 +321,8 @@ def toggle_control(current_user, device_name):
         session.commit()
         
         if control.gpio_pin is not None:
-            # Create an Actuator instance using the device's simulate flag.
-            actuator = Actuator(int(control.gpio_pin), control.device_name, simulate=control.simulate)
+            # Get the pooled actuator for this pin, using the device's simulate flag.
+            actuator = get_actuator(int(control.gpio_pin), control.device_name, control.simulate)
             # Turn on or off the actuator based on the new status.
             if control.current_status:
                 actuator.turn_on()
@@ -325,7 +343,7 @@ def control_settings(current_user, device_name):
           threshold, control_logic, hysteresis, and the simulation flag.
     """
     with Session() as session:
-        control = session.query(DeviceControl).filter_by(device_name=device_name).first()
+        control = session.execute(DEVICE_BY_NAME_STMT, {"n": device_name}).scalar_one_or_none()
         if not control:
             return jsonify({'message': 'Device not found'}), 404
         if request.method == 'POST':
@@ -414,7 +432,7 @@ def add_device(current_user):
 
     with Session() as session:
         # Check if a device with the given name already exists.
-        existing = session.query(DeviceControl).filter_by(device_name=data.get('device_name')).first()
+        existing = session.execute(DEVICE_BY_NAME_STMT, {"n": data.get('device_name')}).scalar_one_or_none()
         if existing:
             return jsonify({'message': 'Device already exists'}), 400
         # Create a new DeviceControl record with the provided settings.
@@ -496,7 +514,7 @@ def update_device(current_user):
         return jsonify({'message': 'Auto Time must be in HH:MM format'}), 400
 
     with Session() as session:
-        device = session.query(DeviceControl).filter_by(device_name=device_name).first()
+        device = session.execute(DEVICE_BY_NAME_STMT, {"n": device_name}).scalar_one_or_none()
         if not device:
             return jsonify({'message': 'Device not found'}), 404
         # Update device fields with new settings if provided; otherwise, keep existing values.
@@ -534,7 +552,7 @@ def delete_device(current_user):
     if not device_name:
         return jsonify({'message': 'Device name is required'}), 400
     with Session() as session:
-        device = session.query(DeviceControl).filter_by(device_name=device_name).first()
+        device = session.execute(DEVICE_BY_NAME_STMT, {"n": device_name}).scalar_one_or_none()
         if not device:
             return jsonify({'message': 'Device not found'}), 404
         session.delete(device)
@@ -574,7 +592,7 @@ def add_sensor(current_user):
 
     with Session() as session:
         # Check if a sensor with the same name already exists.
-        existing = session.query(SensorConfig).filter_by(sensor_name=data.get('sensor_name')).first()
+        existing = session.execute(SENSOR_BY_NAME_STMT, {"n": data.get('sensor_name')}).scalar_one_or_none()
         if existing:
             return jsonify({'message': 'Sensor already exists'}), 400
         # Create a new SensorConfig record.
@@ -633,7 +651,7 @@ def update_sensor(current_user):
     if 'sensor_type' in settings and settings.get('sensor_type').lower() not in supported_types:
         return jsonify({'message': f"Unsupported sensor type. Supported types: {', '.join(supported_types)}"}), 400
     with Session() as session:
-        sensor = session.query(SensorConfig).filter_by(sensor_name=sensor_name).first()
+        sensor = session.execute(SENSOR_BY_NAME_STMT, {"n": sensor_name}).scalar_one_or_none()
         if not sensor:
             return jsonify({'message': 'Sensor not found'}), 404
         sensor.sensor_type = settings.get('sensor_type', sensor.sensor_type).lower()
@@ -657,7 +675,7 @@ def delete_sensor(current_user):
     if not sensor_name:
         return jsonify({'message': 'Sensor name is required'}), 400
     with Session() as session:
-        sensor = session.query(SensorConfig).filter_by(sensor_name=sensor_name).first()
+        sensor = session.execute(SENSOR_BY_NAME_STMT, {"n": sensor_name}).scalar_one_or_none()
         if not sensor:
             return jsonify({'message': 'Sensor not found'}), 404
         session.delete(sensor)
@@ -817,7 +835,7 @@ def update_unique_viewer_count():
         normalized_counter = {uid: 1 for uid in session_counters}
         # The total unique viewers is the number of keys in session_counters.
         unique_viewers = len(normalized_counter)
-        print(f"[Debounce Update] Unique viewer count: {unique_viewers}")
+        logger.debug("[Debounce Update] Unique viewer count: %s", unique_viewers)
 
         # If no unique sessions remain, schedule FFmpeg to stop.
         if unique_viewers == 0:
@@ -857,14 +875,14 @@ def handle_connect():
         # Increment the counter: if this session already exists, add 1; otherwise, initialize with 1.
         if unique_id in session_counters:
             session_counters[unique_id] += 1
-            print(f"[SocketIO Connect] Additional connection from session '{unique_id}'. Count now: {session_counters[unique_id]}")
+            logger.debug("[SocketIO Connect] Additional connection from session '%s'. Count now: %s", unique_id, session_counters[unique_id])
         else:
             session_counters[unique_id] = 1
-            print(f"[SocketIO Connect] New unique session connected: '{unique_id}'.")
+            logger.info("[SocketIO Connect] New unique session connected: '%s'.", unique_id)
 
-        # Debug: print the total unique sessions by counting keys in session_counters.
+        # Debug: log the total unique sessions by counting keys in session_counters.
         unique_viewers = len(session_counters)
-        print(f"[SocketIO Connect] Total unique viewers: {unique_viewers}")
+        logger.debug("[SocketIO Connect] Total unique viewers: %s", unique_viewers)
 
     # Schedule a debounced update of the unique viewer count.
     schedule_debounce_update()
@@ -888,22 +906,22 @@ def handle_disconnect():
     global session_counters, session_map
 
     sid = request.sid
-    print(f"[{datetime.now()}] Disconnect event received for SID: {sid}")
+    logger.debug("[SocketIO Disconnect] Disconnect event received for SID: %s", sid)
     
     with sessions_lock:
         unique_id = session_map.get(sid)
         if unique_id:
             del session_map[sid]
             session_counters[unique_id] -= 1
-            print(f"[{datetime.now()}] Disconnected from unique session '{unique_id}'. Remaining count: {session_counters[unique_id]}")
+            logger.debug("[SocketIO Disconnect] Disconnected from unique session '%s'. Remaining count: %s", unique_id, session_counters[unique_id])
             if session_counters[unique_id] <= 0:
                 del session_counters[unique_id]
-                print(f"[{datetime.now()}] Unique session '{unique_id}' fully disconnected.")
+                logger.info("[SocketIO Disconnect] Unique session '%s' fully disconnected.", unique_id)
         else:
-            print(f"[{datetime.now()}] No unique session mapping found for SID: {sid}.")
+            logger.warning("[SocketIO Disconnect] No unique session mapping found for SID: %s.", sid)
     
         unique_viewers = len(session_counters)
-        print(f"[{datetime.now()}] Total unique viewers after disconnect: {unique_viewers}")
+        logger.debug("[SocketIO Disconnect] Total unique viewers after disconnect: %s", unique_viewers)
 
     schedule_debounce_update()
     if unique_viewers == 0:
@@ -916,7 +934,7 @@ def schedule_stop_ffmpeg():
             # Wait 60 seconds before stopping FFmpeg.
             ffmpeg_stop_timer = threading.Timer(60.0, delayed_stop)
             ffmpeg_stop_timer.start()
-            print("[SocketIO] Scheduled FFmpeg stop in 60 seconds.")
+            logger.info("[SocketIO] Scheduled FFmpeg stop in 60 seconds.")
 
 def delayed_stop():
     global ffmpeg_stop_timer
@@ -924,28 +942,30 @@ def delayed_stop():
         # Compute the unique viewer count.
         unique_viewers = len(session_counters)
     if unique_viewers == 0:
-        print("[SocketIO] No unique viewers remain. Stopping FFmpeg.")
+        logger.info("[SocketIO] No unique viewers remain. Stopping FFmpeg.")
         ffmpeg_controller.stop_ffmpeg()
     else:
-        print("[SocketIO] Unique viewers still active; FFmpeg will remain running.")
+        logger.info("[SocketIO] Unique viewers still active; FFmpeg will remain running.")
     with stop_timer_lock:
         ffmpeg_stop_timer = None
 
 @socketio.on('heartbeat')
 def handle_heartbeat(data):
     sid = request.sid
-    heartbeat_times[sid] = datetime.utcnow()
-    print(f"[Heartbeat] Received heartbeat from SID: {sid} at {heartbeat_times[sid]}")
+    # Heartbeats are timed with time.monotonic(): it is cheaper than building a datetime for every
+    # heartbeat and is not affected by the system clock being changed (e.g., by NTP after boot).
+    heartbeat_times[sid] = time.monotonic()
+    logger.debug("[Heartbeat] Received heartbeat from SID: %s", sid)
 
 def check_heartbeats():
-    now = datetime.utcnow()
+    now = time.monotonic()
     stale = []
     with sessions_lock:
         for sid, last_hb in heartbeat_times.items():
-            if now - last_hb > timedelta(seconds=7):
+            if now - last_hb > 7:
                 stale.append(sid)
     for sid in stale:
-        print(f"[Heartbeat Cleanup] No heartbeat from SID: {sid} for over 7 seconds. Forcing disconnect.")
+        logger.info("[Heartbeat Cleanup] No heartbeat from SID: %s for over 7 seconds. Forcing disconnect.", sid)
         with sessions_lock:
             uid = session_map.get(sid)
             if uid:
@@ -958,14 +978,14 @@ def check_heartbeats():
                         del session_counters[uid]
                 if sid in heartbeat_times:
                     del heartbeat_times[sid]
-                print(f"[Heartbeat Cleanup] Updated session_counters: {session_counters}")
+                logger.debug("[Heartbeat Cleanup] Updated session_counters: %s", session_counters)
         schedule_debounce_update()
 
 # Schedule check_heartbeats to run periodically (e.g., every 5 seconds)
 def start_heartbeat_checker():
     def loop():
         while True:
-            print("[Heartbeat Checker] Checking at", datetime.utcnow())
+            logger.debug("[Heartbeat Checker] Checking heartbeats.")
             check_heartbeats()
             time.sleep(5)
     threading.Thread(target=loop, daemon=True).start()
@@ -16,13 +16,19 @@ In "above" logic (the reverse):
 The controller uses the sensor_value provided (read externally) to make its decision.
 """
 
+import logging  # For logging controller decisions
+
+# Create a logger object specific to this module for logging messages.
+logger = logging.getLogger(__name__)
+
 class SensorActuatorController:
     def __init__(self, actuator, threshold, control_logic="below", hysteresis=0.5, initial_active=False):
         """
         Initialize the SensorActuatorController.
 
         Parameters:
-          actuator (object): An instance that implements turn_on() and turn_off() methods.
+          actuator (object): An instance that implements turn_on() and turn_off() methods
+                             (may be None when only decide() is used).
           threshold (float): The numeric threshold value against which sensor readings are compared.
           control_logic (str): A string, either "below" or "above". Determines when to turn on the actuator.
           hysteresis (float): A tolerance value to prevent rapid toggling (default is 0.5).
@@ -33,12 +39,58 @@ class SensorActuatorController:
         self.threshold = threshold
         self.control_logic = control_logic
         self.hysteresis = hysteresis
+        # The edges of the hysteresis band, computed once instead of on every comparison.
+        self.lower_limit = threshold - hysteresis
+        self.upper_limit = threshold + hysteresis
         # The active property holds the current on/off state of the actuator.
         self.active = initial_active
 
+    def decide(self, sensor_value):
+        """
+        Works out whether the actuator should be on after this sensor_value, without switching it.
+        The decision is based on the control_logic ("below" or "above") and the hysteresis value,
+        exactly as described in check_and_update().
+
+        This lets the caller combine the decisions of several rules that control the same
+        actuator and switch the actuator only once (see combined_task() in main.py).
+
+        Parameters:
+          sensor_value (float): The sensor reading to evaluate.
+
+        Returns:
+          bool: True if the actuator should be on, False if it should be off.
+        """
+        # Log the current sensor value and controller settings for debugging purposes.
+        logger.debug("[Controller] sensor_value=%s, threshold=%s, hysteresis=%s, active=%s",
+                     sensor_value, self.threshold, self.hysteresis, self.active)
+
+        if self.control_logic == "below":
+            # For "below" logic: We want the actuator ON when sensor_value is very low.
+            if not self.active and sensor_value < self.lower_limit:
+                logger.debug("[Controller] Wants ON: %s < %s", sensor_value, self.lower_limit)
+                return True
+            if self.active and sensor_value > self.upper_limit:
+                logger.debug("[Controller] Wants OFF: %s > %s", sensor_value, self.upper_limit)
+                return False
+            logger.debug("[Controller] No change required for 'below' logic.")
+        elif self.control_logic == "above":
+            # For "above" logic: We want the actuator ON when sensor_value is very high.
+            if not self.active and sensor_value > self.upper_limit:
+                logger.debug("[Controller] Wants ON: %s > %s", sensor_value, self.upper_limit)
+                return True
+            if self.active and sensor_value < self.lower_limit:
+                logger.debug("[Controller] Wants OFF: %s < %s", sensor_value, self.lower_limit)
+                return False
+            logger.debug("[Controller] No change required for 'above' logic.")
+        else:
+            # If the control_logic is not recognized, log an error and keep the current state.
+            logger.error("[Controller] Invalid control_logic specified.")
+        return self.active
+
     def check_and_update(self, sensor_value):
         """
-        Uses the provided sensor_value to determine whether the actuator should be toggled.
+        Uses the provided sensor_value to determine whether the actuator should be toggled,
+        and switches the actuator if so.
         The decision is based on the control_logic ("below" or "above") and the hysteresis value.
 
         Parameters:
@@ -51,38 +103,14 @@ class SensorActuatorController:
         Behavior for "above" logic:
           - If the actuator is off and sensor_value is greater than (threshold + hysteresis), turn it ON.
           - If the actuator is on and sensor_value is less than (threshold - hysteresis), turn it OFF.
-
-        Returns:
-          float: The sensor_value that was used for the decision (for logging or further processing).
         """
-        # Print the current sensor value and controller settings for debugging purposes.
-        print(f"[Controller] sensor_value={sensor_value}, threshold={self.threshold}, "
-              f"hysteresis={self.hysteresis}, active={self.active}")
-
-        if self.control_logic == "below":
-            # For "below" logic: We want the actuator ON when sensor_value is very low.
-            if not self.active and sensor_value < self.threshold - self.hysteresis:
-                print(f"[Controller] Turning ON: {sensor_value} < {self.threshold - self.hysteresis}")
-                self.actuator.turn_on()
-                self.active = True
-            elif self.active and sensor_value > self.threshold + self.hysteresis:
-                print(f"[Controller] Turning OFF: {sensor_value} > {self.threshold + self.hysteresis}")
-                self.actuator.turn_off()
-                self.active = False
-            else:
-                print("[Controller] No change required for 'below' logic.")
-        elif self.control_logic == "above":
-            # For "above" logic: We want the actuator ON when sensor_value is very high.
-            if not self.active and sensor_value > self.threshold + self.hysteresis:
-                print(f"[Controller] Turning ON: {sensor_value} > {self.threshold + self.hysteresis}")
-                self.actuator.turn_on()
-                self.active = True
-            elif self.active and sensor_value < self.threshold - self.hysteresis:
-                print(f"[Controller] Turning OFF: {sensor_value} < {self.threshold - self.hysteresis}")
-                self.actuator.turn_off()
-                self.active = False
-            else:
-                print("[Controller] No change required for 'above' logic.")
+        wanted = self.decide(sensor_value)
+        if wanted == self.active:
+            return
+        if wanted:
+            logger.info("[Controller] Turning ON (sensor_value=%s)", sensor_value)
+            self.actuator.turn_on()
         else:
-            # If the control_logic is not recognized, print an error.
-            print("[Controller] Invalid control_logic specified.")
+            logger.info("[Controller] Turning OFF (sensor_value=%s)", sensor_value)
+            self.actuator.turn_off()
+        self.active = wanted
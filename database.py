@@ -14,11 +14,12 @@ It also sets up the database engine and creates a session factory for interactin
 
 # Import standard modules and functions
 import os                           # Provides a way of using operating system dependent functionality (like environment variables)
+import functools                    # For building the releases_session decorator
 import datetime                     # Used for handling dates and times
 
 # Import SQLAlchemy components for database modeling and session management
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy import create_engine, event, make_url, select, Column, Integer, String, Float, Boolean, DateTime, Text, Index
+from sqlalchemy.orm import sessionmaker, scoped_session, DeclarativeBase, relationship
 # sqlalchemy_utils helps to check if a database exists and create one if not
 from sqlalchemy_utils import database_exists, create_database
 
@@ -34,6 +35,10 @@ from zoneinfo import ZoneInfo
 # This will load variables from a .env file into the environment.
 load_dotenv()
 
+# The greenhouse's local time zone, used for timestamps recorded by the database layer.
+# Created once here instead of on every row insert.
+LOCAL_TZ = ZoneInfo("America/Chicago")
+
 # Get the DATABASE_URL environment variable. If it's not set, default to using a local SQLite database file named "greenhouse.db"
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///greenhouse.db')
 
@@ -104,8 +109,12 @@ class SensorLog(Base):
     sensor_type = Column(String(50))  # This could be the sensor's name or type.
     value = Column(Float)             # The reading value (e.g., temperature, humidity, etc.)
     # The default timestamp is set to the current time in the "America/Chicago" timezone.
-    timestamp = Column(DateTime(timezone=True), 
-                       default=lambda: datetime.datetime.now(ZoneInfo("America/Chicago")))
+    # Callers that insert a batch of readings can pass one shared timestamp explicitly instead.
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(LOCAL_TZ))
+
+# Index for the dashboard's "readings for sensor X ordered by time" queries.
+# Without it every chart request scans the whole (ever-growing) sensor_logs table.
+Index('ix_sensorlog_type_time', SensorLog.sensor_type, SensorLog.timestamp.desc())
 
 # ---------------------------
 # Define the DeviceControl Model
@@ -185,6 +194,13 @@ class ControllerConfig(Base):
       - threshold: The sensor threshold value for triggering control.
       - control_logic: "below" or "above" indicating when to trigger the actuator.
       - hysteresis: Tolerance value to prevent rapid toggling (default is 0.5).
+
+    Relationships (read-only; the names are not database foreign keys):
+      - sensor_config: The SensorConfig row named by sensor_name.
+      - actuator_device: The DeviceControl row named by actuator_name.
+      Both use lazy="raise", so they must be loaded up front with selectinload(...)
+      at the query site. Touching an unloaded relationship raises instead of silently
+      issuing one extra SELECT per rule (the N+1 query pattern).
     """
     __tablename__ = 'controller_configs'
     id = Column(Integer, primary_key=True)
@@ -194,11 +210,79 @@ class ControllerConfig(Base):
     control_logic = Column(String(10), nullable=False)    # "below" or "above"
     hysteresis = Column(Float, default=0.5)                 # Tolerance value
 
+    # Read-only links to the rows the names refer to. They join on the name columns (foreign() marks
+    # the rule's side), so no foreign key is added to the table and writes through them are ignored.
+    sensor_config = relationship("SensorConfig", viewonly=True, lazy="raise",
+                                 primaryjoin="foreign(ControllerConfig.sensor_name) == SensorConfig.sensor_name")
+    actuator_device = relationship("DeviceControl", viewonly=True, lazy="raise",
+                                   primaryjoin="foreign(ControllerConfig.actuator_name) == DeviceControl.device_name")
+
+# ---------------------------
+# Define the ConfigVersion Model
+# ---------------------------
+class ConfigVersion(Base):
+    """
+    Model holding a single counter that changes whenever the automation configuration changes.
+
+    The scheduler keeps the sensor configurations and controller rules in memory and reloads
+    them only when this version differs from the one it loaded them with.
+
+    Fields:
+      - id: Always 1 (there is only one row).
+      - version: Incremented by bump_config_version() on every configuration change.
+    """
+    __tablename__ = 'config_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
 # ---------------------------
 # Set Up the Database Engine and Session
 # ---------------------------
 # Create an engine based on the DATABASE_URL.
-engine = create_engine(DATABASE_URL)
+# The connection pool is sized explicitly because the scheduler jobs and the Flask request
+# handlers share it: up to 10 pooled connections plus 5 overflow connections under load.
+# pool_use_lifo hands out the most recently returned connection first, so the rapid
+# session opens of each scheduler cycle keep reusing one warm connection while idle
+# extra connections are left alone (and, on a server database, time out and are recycled).
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite connections are handed between the scheduler thread and request threads,
+    # so allow a connection to be used from a thread other than the one that opened it.
+    sqlite_options = {}
+    if make_url(DATABASE_URL).database not in (None, "", ":memory:"):
+        # Only a file-backed database gets the QueuePool sized above. An in-memory database
+        # ("sqlite://") uses SingletonThreadPool, which does not accept these options.
+        sqlite_options.update(pool_size=10, max_overflow=5, pool_use_lifo=True)
+    engine = create_engine(DATABASE_URL,
+                           connect_args={"check_same_thread": False},
+                           **sqlite_options)
+else:
+    # For a server database (e.g., PostgreSQL), test each connection before use so that
+    # connections dropped by the server are replaced instead of failing a task, and
+    # replace connections older than 30 minutes before the server or a firewall drops them.
+    engine_options = {}
+    if make_url(DATABASE_URL).drivername in ("postgresql", "postgresql+psycopg2"):
+        # With psycopg2, send executemany() UPDATEs and DELETEs (e.g., several device status
+        # changes in one cycle) in pages with psycopg2's execute_batch() instead of one statement
+        # per row. Multi-row INSERTs are batched into INSERT ... VALUES pages either way.
+        engine_options["executemany_mode"] = "values_plus_batch"
+    engine = create_engine(DATABASE_URL, pool_size=10, max_overflow=5, pool_use_lifo=True,
+                           pool_recycle=1800, pool_pre_ping=True, **engine_options)
+
+# When running on SQLite, tune every new connection for our write-heavy logging workload:
+#   - WAL journal mode lets readers (the web UI) proceed while the scheduler writes,
+#     and roughly halves the fsync cost of each commit.
+#   - synchronous=NORMAL is safe with WAL and avoids an fsync on every transaction.
+#   - A ~20 MB page cache and in-memory temp storage keep queries off the SD card.
+# These PRAGMAs do not apply to other databases (e.g., PostgreSQL), so the listener is SQLite-only.
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-20000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 
 # Check if the database exists; if not, create it.
 if not database_exists(engine.url):
@@ -208,16 +292,116 @@ if not database_exists(engine.url):
 # Create all tables in the database based on our models.
 Base.metadata.create_all(engine)
 
+# create_all() skips tables that already exist, so indexes added to a model later
+# would never reach an existing database. Create any that are missing (CREATE INDEX
+# is only issued when the index is not already present).
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
 # Create a session factory that can be used to create new database sessions.
-Session = sessionmaker(bind=engine)
+# scoped_session gives every thread (a web request thread, a scheduler worker thread) its own
+# session and hands the same one back on each Session() call in that thread, instead of building
+# a new Session object every time. "with Session() as session:" still closes it at the end of the
+# block; Session.remove() discards a thread's session entirely (done after each web request).
+# expire_on_commit=False keeps loaded objects usable after session.commit(): every session is
+# short-lived (one web request or one scheduler cycle), so re-reading each object from the
+# database after a commit (e.g., to return the updated device in a response) would be wasted work.
+Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+
+def releases_session(func):
+    """
+    Decorator for scheduled jobs: discards the calling thread's session when the job ends.
+
+    Scheduler worker threads live for the whole process, so without this each one would keep its
+    scoped session (and everything loaded into it) between runs. Web requests get the same
+    treatment from app.py's teardown handler.
+
+    Parameters:
+      func (callable): The job function.
+
+    Returns:
+      callable: The wrapped job, which calls Session.remove() after func returns or raises.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            Session.remove()
+    return wrapper
+
+def bump_config_version(connection):
+    """
+    Increments the configuration version (creating its row on first use).
+
+    Parameters:
+      connection: The database connection of the transaction that changes the configuration,
+                  so the new version is committed (or rolled back) together with the change.
+    """
+    table = ConfigVersion.__table__
+    result = connection.execute(table.update().where(table.c.id == 1).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=1, version=1))
+
+@event.listens_for(Session, "before_flush")
+def _bump_version_on_config_change(session, flush_context, instances):
+    """
+    Bumps the configuration version whenever a flush adds, changes or deletes a sensor
+    configuration or a controller rule (the data the scheduler keeps in memory).
+    Devices are not part of that snapshot (the scheduler loads them every cycle), so device
+    changes do not count.
+    """
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, (SensorConfig, ControllerConfig)):
+            bump_config_version(session.connection())
+            return
+    for obj in session.dirty:
+        if isinstance(obj, (SensorConfig, ControllerConfig)) and session.is_modified(obj):
+            bump_config_version(session.connection())
+            return
 
 # ---------------------------
 # Seeding Data (Only run when this file is executed directly)
 # ---------------------------
 if __name__ == '__main__':
     from werkzeug.security import generate_password_hash  # Import function to hash passwords securely
+    # Each table is seeded with one multi-row INSERT ... ON CONFLICT DO NOTHING,
+    # so rows that already exist are skipped by the database instead of being looked up one by one.
+    # PostgreSQL and SQLite provide this through their dialect's insert(). Other databases have no
+    # such statement, so for them the existing rows are looked up first and only the rest inserted.
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        insert = None
     session = Session()  # Create a new database session
 
+    def insert_missing(model, key, rows):
+        """
+        Inserts the rows whose key value is not in the table yet.
+
+        Parameters:
+          model: The model (table) to insert into.
+          key (str): The name of the unique column that identifies a row (e.g., 'username').
+          rows (list): The rows to insert, as dictionaries of column values.
+
+        Returns:
+          int: The number of rows that were added.
+        """
+        if not rows:
+            return 0
+        if insert is not None:
+            result = session.execute(insert(model).values(rows).on_conflict_do_nothing(index_elements=[key]))
+            return result.rowcount
+        column = getattr(model, key)
+        existing = set(session.scalars(select(column).where(column.in_([row[key] for row in rows]))))
+        missing = [row for row in rows if row[key] not in existing]
+        if missing:
+            session.execute(model.__table__.insert(), missing)
+        return len(missing)
+
     # --- Seed Users ---
     # Define a list of user dictionaries to add to the database.
     users_to_add = [
@@ -225,46 +409,46 @@ if __name__ == '__main__':
         {'username': 'senior', 'password': '4sA5h66k', 'role': 'senior'},
         {'username': 'junior', 'password': 'nq753MkF', 'role': 'junior'},
     ]
-
-    # Loop through each user and add them if they don't already exist.
-    for user_data in users_to_add:
-        existing_user = session.query(User).filter_by(username=user_data['username']).first()
-        if not existing_user:
-            # Create a new User object with a hashed password.
-            new_user = User(
-                username=user_data['username'],
-                password_hash=generate_password_hash(user_data['password']),
-                role=user_data['role']
-            )
-            session.add(new_user)
-            print(f"Added user {user_data['username']}")
-        else:
-            print(f"User {user_data['username']} already exists")
+    # Password hashing is deliberately slow, so only hash passwords for users that are missing.
+    # Re-running the seed script on an existing database then does no hashing at all.
+    existing_usernames = set(session.scalars(
+        select(User.username).where(User.username.in_([u['username'] for u in users_to_add]))
+    ))
+    user_rows = [
+        {
+            'username': user_data['username'],
+            'password_hash': generate_password_hash(user_data['password']),
+            'role': user_data['role']
+        }
+        for user_data in users_to_add
+        if user_data['username'] not in existing_usernames
+    ]
+    # Insert the new users (on PostgreSQL and SQLite, ON CONFLICT still guards against a user
+    # added in the meantime).
+    added = insert_missing(User, 'username', user_rows)
+    print(f"Added {added} new user(s); {len(users_to_add) - added} already existed")
     print("User setup complete.")
 
     # --- Seed Device Controls ---
     # Define a list of device names for actuators.
     device_names = ['White Light', 'Black Light', 'Heat Lamp', 'Water Valve', 'Fresh Air Fan']
-    for name in device_names:
-        # Check if a device with this name already exists.
-        device = session.query(DeviceControl).filter_by(device_name=name).first()
-        if not device:
-            # Create a new DeviceControl object with default settings.
-            new_device = DeviceControl(
-                device_name=name,
-                device_type="actuator",  # Specify that this is an actuator
-                mode="manual",  # Start in manual mode for testing
-                current_status=False,  # Initially off
-                auto_time="08:00",  # Default auto time
-                auto_duration=30,   # Default duration of 30 minutes
-                auto_enabled=True   # Auto control is enabled
-                # Note: gpio_pin, sensor_name, threshold, control_logic, hysteresis, and simulate
-                # can be updated later via admin settings.
-            )
-            session.add(new_device)
-            print(f"Added device control: {name}")
-        else:
-            print(f"Device control {name} already exists")
+    # Every device starts with the same default settings.
+    # Note: gpio_pin, sensor_name, threshold, control_logic, hysteresis, and simulate
+    # can be updated later via admin settings.
+    device_rows = [
+        {
+            'device_name': name,
+            'device_type': "actuator",  # Specify that this is an actuator
+            'mode': "manual",           # Start in manual mode for testing
+            'current_status': False,    # Initially off
+            'auto_time': "08:00",       # Default auto time
+            'auto_duration': 30,        # Default duration of 30 minutes
+            'auto_enabled': True        # Auto control is enabled
+        }
+        for name in device_names
+    ]
+    added = insert_missing(DeviceControl, 'device_name', device_rows)
+    print(f"Added {added} new device control(s); {len(device_rows) - added} already existed")
     print("Device control setup complete.")
 
     # --- Seed Sensor Configurations ---
@@ -278,20 +462,12 @@ if __name__ == '__main__':
         {"sensor_name": "Soil Moisture Sensor",  "sensor_type": "soil_moisture", "config_json": "{}", "simulate": True},
         {"sensor_name": "Wind Speed Sensor",     "sensor_type": "wind_speed",    "config_json": "{}", "simulate": True},
     ]
-    # Loop through each sensor configuration and add it if it doesn't already exist.
-    for conf in sensor_configs:
-        existing = session.query(SensorConfig).filter_by(sensor_name=conf["sensor_name"]).first()
-        if not existing:
-            new_sensor = SensorConfig(
-                sensor_name = conf["sensor_name"],
-                sensor_type = conf["sensor_type"],
-                config_json = conf["config_json"],
-                simulate = conf["simulate"]
-            )
-            session.add(new_sensor)
-            print(f"Added sensor config: {conf['sensor_name']}")
-        else:
-            print(f"Sensor config {conf['sensor_name']} already exists")
+    # Insert any sensor configurations that don't already exist.
+    added = insert_missing(SensorConfig, 'sensor_name', sensor_configs)
+    print(f"Added {added} new sensor config(s); {len(sensor_configs) - added} already existed")
+    # The rows above were inserted without the ORM, so bump the configuration version here
+    # to make a running scheduler reload its sensor configurations.
+    bump_config_version(session.connection())
     # Commit all seeded data to the database.
     session.commit()
     print("Sensor configuration setup complete.")
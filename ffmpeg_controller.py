@@ -10,7 +10,7 @@ It includes three main functions:
 Note:
   - When running in the background (e.g., via nohup), any output from the print statements will be redirected to the log file specified,
     or to the default nohup.out if not redirected.
-  - This module uses the 'pgrep' command to search for processes. Ensure that your environment includes this tool (most Linux systems do).
+  - Existing FFmpeg processes are found by reading /proc directly (Linux only); no external tools such as 'pgrep' are needed.
 
 Usage:
   - Import and call start_ffmpeg() to launch the FFmpeg process.
@@ -22,6 +22,10 @@ import os
 import signal
 import time
 import threading
+from dotenv import load_dotenv
+
+# Load settings (such as FFMPEG_TRANSCODE) from a .env file into the environment.
+load_dotenv()
 
 ffmpeg_state_lock = threading.Lock()
 socketio = None
@@ -30,6 +34,100 @@ ffmpeg_ready_flag = False
 # Global variable to store the FFmpeg process reference.
 ffmpeg_process = None
 
+# Location of the HLS playlist written by FFmpeg (segments are written next to it).
+PLAYLIST_PATH = '/tmp/hls/stream.m3u8'
+
+# Whether to re-encode the camera's MJPEG output to H.264 (the default).
+# Set FFMPEG_TRANSCODE=false to pass the camera's MJPEG frames straight through into
+# fragmented-MP4 HLS segments instead: no decoding or encoding work at all, but the
+# stream then only plays in clients that can decode MJPEG inside HLS.
+TRANSCODE = os.getenv('FFMPEG_TRANSCODE', 'true').lower() != 'false'
+
+# Hardware H.264 encoders on the Raspberry Pi, in order of preference:
+#   - h264_v4l2m2m: the V4L2 memory-to-memory encoder on current Raspberry Pi OS kernels.
+#   - h264_omx: the OpenMAX encoder on legacy (Buster and earlier) images.
+HARDWARE_ENCODERS = ['h264_v4l2m2m', 'h264_omx']
+
+# Encoder arguments chosen by get_encoder_args(); probed once and then reused.
+encoder_args = None
+
+
+def hardware_encoder_works(encoder):
+    """
+    Checks that a hardware encoder can actually encode on this machine.
+
+    'ffmpeg -encoders' only lists what the FFmpeg build supports: the encoder is listed even when
+    the hardware or its driver is missing (e.g., h264_omx on a current kernel, or any Pi encoder
+    on another board), and the real stream would then fail right after starting. So one frame of
+    FFmpeg's built-in test pattern is encoded with it (discarding the output).
+
+    Parameters:
+      encoder (str): The FFmpeg encoder name (e.g., 'h264_v4l2m2m').
+
+    Returns:
+      bool: True if the test encode succeeded.
+    """
+    test_command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc=size=640x480:rate=30',  # Generated test pattern, no camera needed.
+        '-frames:v', '1',
+        '-c:v', encoder, '-pix_fmt', 'yuv420p',
+        '-f', 'null', '-',                                    # Discard the encoded frame.
+    ]
+    try:
+        result = subprocess.run(test_command, capture_output=True, text=True, timeout=10, check=False)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[ffmpeg_controller] Test encode with {encoder} failed: {e}")
+        return False
+    if result.returncode != 0:
+        print(f"[ffmpeg_controller] Test encode with {encoder} failed: {result.stderr.strip()}")
+        return False
+    return True
+
+
+def get_encoder_args():
+    """
+    Returns the FFmpeg video encoder arguments to use for the HLS stream.
+
+    Software encoding with libx264 keeps most of a Raspberry Pi's CPU busy at 640x480@30,
+    which starves the web server and the scheduler. When this FFmpeg build offers one of the
+    HARDWARE_ENCODERS and a test encode with it succeeds (see hardware_encoder_works()),
+    encoding is done by the Pi's dedicated video hardware instead.
+    Otherwise libx264 (with the previous low-latency settings) is used as a fallback.
+
+    The available encoders are probed with 'ffmpeg -encoders' on the first call only.
+    """
+    global encoder_args
+    if encoder_args is not None:
+        return encoder_args
+
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, check=False)
+        available = result.stdout
+    except OSError as e:
+        print(f"[ffmpeg_controller] Could not probe FFmpeg encoders: {e}")
+        available = ""
+
+    for encoder in HARDWARE_ENCODERS:
+        if f" {encoder} " in available and hardware_encoder_works(encoder):
+            print(f"[ffmpeg_controller] Using hardware encoder {encoder}.")
+            encoder_args = [
+                '-c:v', encoder,                   # Hardware H.264 encoder.
+                '-pix_fmt', 'yuv420p',             # The hardware encoders expect 4:2:0 input (MJPEG decodes to 4:2:2).
+                '-b:v', '1M',                      # Target bitrate: 1 Mbit/s.
+            ]
+            return encoder_args
+
+    print("[ffmpeg_controller] No working hardware H.264 encoder found; falling back to libx264.")
+    encoder_args = [
+        '-vcodec', 'libx264',              # Use libx264 for encoding.
+        '-preset', 'veryfast',             # Use very fast settings for low latency.
+        '-tune', 'zerolatency',            # Tune for zero latency.
+        '-sc_threshold', '0',              # Disable scene cut detection.
+        '-x264-params', 'keyint=60:scenecut=0',  # Force keyframes every 60 frames.
+    ]
+    return encoder_args
+
 
 def set_socketio(sio):
     """
@@ -44,6 +142,30 @@ def is_ffmpeg_ready():
     """
     return ffmpeg_ready_flag
 
+def find_existing_ffmpeg_pids():
+    """
+    Scans /proc for running FFmpeg processes that capture from our camera (/dev/video0 via v4l2).
+
+    Each /proc/<pid>/cmdline file holds a process's arguments separated by NUL bytes, so the
+    command line can be matched directly in Python without starting an external tool.
+
+    Returns:
+      list[int]: The PIDs of matching FFmpeg processes.
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                args = f.read().decode(errors="ignore").split("\0")
+        except OSError:
+            # The process exited while we were scanning, or we are not allowed to read it.
+            continue
+        if args and os.path.basename(args[0]) == "ffmpeg" and "v4l2" in args and "/dev/video0" in args:
+            pids.append(int(entry))
+    return pids
+
 def kill_existing_ffmpeg():
     """
     Looks for any running FFmpeg processes that were started with a command pattern that identifies 
@@ -51,31 +173,66 @@ def kill_existing_ffmpeg():
 
     This prevents duplicate FFmpeg processes from running simultaneously.
     """
-    try:
-        # 'pgrep -f' searches for processes where the command line contains a specific string.
-        # Here, we look for a command that includes "ffmpeg -f v4l2", which should match the FFmpeg process.
-        result = subprocess.run(["pgrep", "-f", "ffmpeg -f v4l2"], capture_output=True, text=True, check=False)
-        if result.returncode == 0:
-          
-          pids = result.stdout.strip().splitlines()
-          if pids:
-              print(f"[ffmpeg_controller] Found existing FFmpeg processes: {pids}")
-              for pid in pids:
-                  try:
-                      os.kill(int(pid), signal.SIGTERM)
-                      print(f"[ffmpeg_controller] Killed FFmpeg process with PID {pid}")
-                  except Exception as e:
-                      print(f"[ffmpeg_controller] Error killing FFmpeg process {pid}: {e}")
-        else:
-            print("[ffmpeg_controller] No existing FFmpeg processes found.")
-    except subprocess.CalledProcessError:
-        # CalledProcessError occurs if pgrep finds no matching processes.
+    pids = find_existing_ffmpeg_pids()
+    if not pids:
         print("[ffmpeg_controller] No existing FFmpeg processes found.")
+        return
+    print(f"[ffmpeg_controller] Found existing FFmpeg processes: {pids}")
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            print(f"[ffmpeg_controller] Killed FFmpeg process with PID {pid}")
+        except Exception as e:
+            print(f"[ffmpeg_controller] Error killing FFmpeg process {pid}: {e}")
+
+def wait_for_playlist(timeout=15):
+    """
+    Blocks until FFmpeg has written the HLS playlist (/tmp/hls/stream.m3u8) or the timeout expires.
+
+    When the optional inotify_simple package is installed, the thread sleeps on an inotify watch
+    of /tmp/hls and wakes up as soon as the playlist appears. FFmpeg writes the playlist to a
+    temporary file and renames it, so both file creation and rename-into-place events are watched.
+    Without inotify_simple (or if /tmp/hls does not exist yet), it falls back to checking for
+    the file every 0.5 seconds.
+
+    Parameters:
+      timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+      bool: True if the playlist exists, False if the wait timed out.
+    """
+    hls_dir, playlist_name = os.path.split(PLAYLIST_PATH)
+    deadline = time.monotonic() + timeout
+
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        INotify = None
+
+    if INotify is not None and os.path.isdir(hls_dir):
+        with INotify() as inotify:
+            inotify.add_watch(hls_dir, flags.CREATE | flags.MOVED_TO)
+            # Check after adding the watch so a playlist created in between is not missed.
+            while not os.path.exists(PLAYLIST_PATH):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                for event in inotify.read(timeout=int(remaining * 1000)):
+                    if event.name == playlist_name:
+                        return True
+            return True
+
+    # Fallback: poll for the playlist file.
+    while not os.path.exists(PLAYLIST_PATH):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.5)
+    return True
 
 def start_ffmpeg():
     """
-    Starts the FFmpeg process for capturing video from /dev/video0, encoding it with libx264,
-    and generating HLS segments in /tmp/hls/stream.m3u8.
+    Starts the FFmpeg process for capturing video from /dev/video0, encoding it to H.264
+    (see get_encoder_args()), and generating HLS segments in /tmp/hls/stream.m3u8.
     
     This function first calls kill_existing_ffmpeg() to ensure there are no duplicate
     FFmpeg processes running. It then constructs the FFmpeg command as a list of arguments,
@@ -91,6 +248,18 @@ def start_ffmpeg():
         print("[ffmpeg_controller] FFmpeg already running.")
         return
         
+      if TRANSCODE:
+        video_args = [
+            *get_encoder_args(),               # Hardware H.264 encoder if available, else libx264.
+            '-r', '30',                        # Output frame rate: 30 fps.
+            '-g', '60',                        # GOP size (group of pictures): 60 frames.
+        ]
+      else:
+        video_args = [
+            '-c:v', 'copy',                    # Pass the camera's MJPEG frames through untouched.
+            '-hls_segment_type', 'fmp4',       # MJPEG needs fragmented-MP4 segments (not MPEG-TS).
+        ]
+
       # Build the FFmpeg command as a list. Adjust any parameters as needed.
       ffmpeg_command = [
           'nice', '-n', '5',
@@ -100,35 +269,27 @@ def start_ffmpeg():
           '-input_format', 'mjpeg',          # Expect the camera to provide MJPEG.
           '-video_size', '640x480',          # Set video resolution to 640x480.
           '-i', '/dev/video0',               # Input device.
-          '-vcodec', 'libx264',              # Use libx264 for encoding.
-          '-preset', 'veryfast',             # Use very fast settings for low latency.
-          '-tune', 'zerolatency',            # Tune for zero latency.
-          '-r', '30',                        # Output frame rate: 30 fps.
-          '-g', '60',                        # GOP size (group of pictures): 60 frames.
-          '-sc_threshold', '0',              # Disable scene cut detection.
-          '-x264-params', 'keyint=60:scenecut=0',  # Force keyframes every 60 frames.
+          *video_args,                       # Transcode or copy the video (see above).
           '-an',                             # Disable audio.
           '-f', 'hls',                       # Output format is HLS.
           '-hls_time', '2',                  # Each HLS segment duration: 2 seconds.
           '-hls_list_size', '20',            # Keep a maximum of 20 segments in the playlist  
           '-hls_flags', 'delete_segments',   # Delete old segments automatically.
-          '/tmp/hls/stream.m3u8'             # Output playlist location.
+          PLAYLIST_PATH                      # Output playlist location.
       ]
       
       print("[ffmpeg_controller] Starting FFmpeg process with command:")
       print(" ".join(ffmpeg_command))
   
       # Start FFmpeg as a background process.
+      # Its output is discarded (DEVNULL) rather than piped: nothing reads the pipes, so a full
+      # pipe buffer would stall FFmpeg, and waiting on communicate() here would block the caller
+      # and kill the stream on timeout.
       ffmpeg_process = subprocess.Popen(ffmpeg_command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
       print(f"[ffmpeg_controller] FFmpeg process started with PID: {ffmpeg_process.pid}")
   
-    timeout = 15
-    start_time = time.time()
-    while not os.path.exists("/tmp/hls/stream.m3u8"):
-      if time.time() - start_time > timeout:
-        print("[ffmpeg_controller] Timeout waiting for stream.m3u8")
-        break
-      time.sleep(0.5)
+    if not wait_for_playlist(timeout=15):
+      print("[ffmpeg_controller] Timeout waiting for stream.m3u8")
 
     with ffmpeg_state_lock:
       ffmpeg_ready_flag = True
@@ -13,24 +13,255 @@ and the same reading is used both for logging and for automation decisions.
 
 import atexit                             # For registering cleanup functions at program exit
 import datetime                           # For working with dates and times
+import os                                 # For file paths and environment variables
+import queue                              # For handing sensor logs to the writer thread
+import threading                          # For the sensor log writer thread
 import time
-import json                               # For handling JSON data
+from collections import defaultdict     # For grouping controller rules by actuator
+import logging                            # For logging status messages and errors
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError  # For reading several sensors at the same time
 from apscheduler.schedulers.background import BackgroundScheduler  # Scheduler for running tasks periodically
-from database import Session, SensorLog, DeviceControl, SensorConfig, ControllerConfig
-from zoneinfo import ZoneInfo             # For handling time zones
-from sensor import sensor_factory         # Factory function to create sensor instances based on configuration
-from actuator import Actuator             # Class to control actuators (or simulate them)
+from sqlalchemy import select, delete                               # For building ORM queries and bulk deletes
+from sqlalchemy.orm import load_only                                # For loading only the device columns a cycle uses
+from database import Session, SensorLog, DeviceControl, SensorConfig, ControllerConfig, ConfigVersion, LOCAL_TZ, releases_session
+from sensor import get_parsed_config, get_sensor, prune_sensor_instances  # Cached sensor configs and instances
+from actuator import get_actuator         # Returns the pooled actuator for a GPIO pin
 from controller import SensorActuatorController  # Class to manage sensor-actuator control logic
 
+# Create a logger object specific to this module.
+# Routine per-sensor and per-device messages are logged at DEBUG level, state changes at INFO,
+# and problems at WARNING/ERROR. Messages use lazy %-formatting, so nothing is formatted or
+# written for levels that are switched off (the entry point decides the level).
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Logging Settings
+# ---------------------------
+# LOG_LEVEL sets how much the entry point below logs (e.g., "DEBUG" to also see every sensor
+# reading and controller check, or "WARNING" to only see problems).
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+def configure_logging():
+    """
+    Sets up the logging output for this process: LOG_LEVEL and above, with a timestamp,
+    written to the console (stderr). Used by the __main__ section below.
+    """
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# ---------------------------
+# Sensor Log Archiving Settings
+# ---------------------------
+# Sensor readings older than SENSOR_LOG_RETENTION_DAYS are moved out of the database into
+# compressed Parquet files in SENSOR_LOG_ARCHIVE_DIR by archive_sensor_logs().
+SENSOR_LOG_RETENTION_DAYS = int(os.getenv('SENSOR_LOG_RETENTION_DAYS', '30'))
+SENSOR_LOG_ARCHIVE_DIR = os.getenv('SENSOR_LOG_ARCHIVE_DIR', 'archive')
+
+# ---------------------------
+# Parallel Sensor Reading Settings
+# ---------------------------
+# Sensor reads mostly wait on hardware (1-Wire, I²C, DHT22 timing), so up to
+# SENSOR_READ_WORKERS sensors are read at the same time by a thread pool in combined_task().
+SENSOR_READ_WORKERS = int(os.getenv('SENSOR_READ_WORKERS', '8'))
+# The pool is created once and kept for the life of the process, so its threads are reused by
+# every cycle instead of being started and stopped every 30 seconds. Threads are only started
+# when the first read is submitted, i.e., in the process that actually runs combined_task().
+SENSOR_READ_EXECUTOR = ThreadPoolExecutor(max_workers=SENSOR_READ_WORKERS, thread_name_prefix="sensor-read")
+# SENSOR_READ_TIMEOUT is how many seconds a cycle waits for its sensor readings in total. A sensor
+# that has not answered by then is treated as a failed reading (None) for this cycle, so one hung
+# sensor cannot hold up the cycle past the next scheduled run (every 30 seconds).
+SENSOR_READ_TIMEOUT = float(os.getenv('SENSOR_READ_TIMEOUT', '10'))
+
+# ---------------------------
+# Sensor Log Writer
+# ---------------------------
+# combined_task() does not insert its sensor logs itself: it puts each cycle's rows on
+# SENSOR_LOG_QUEUE, and a background writer thread inserts them. The control cycle (sensor
+# reads and actuator switching) therefore never waits on the database for logging, and
+# batches that pile up while the database is slow are written together in one INSERT.
+SENSOR_LOG_QUEUE = queue.Queue()
+# The writer thread, started by queue_sensor_logs() when the first rows arrive (so a process
+# that imports this module without running combined_task(), e.g. the Flask app, has no writer).
+SENSOR_LOG_WRITER = None
+SENSOR_LOG_WRITER_LOCK = threading.Lock()
+
+def write_sensor_logs():
+    """
+    Runs in the writer thread: waits for rows on SENSOR_LOG_QUEUE and inserts them.
+
+    Every batch that is already waiting is taken along, so all of them are inserted
+    with one bulk INSERT and one commit.
+
+    A failed insert is rolled back and tried once more after a second (e.g., when SQLite was
+    briefly locked by another writer). If the second attempt fails as well, the rows are logged
+    as lost and dropped: these sensor readings are then missing from sensor_logs, while the
+    writer goes on with the next batches.
+    """
+    while True:
+        batches = [SENSOR_LOG_QUEUE.get()]
+        while True:
+            try:
+                batches.append(SENSOR_LOG_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        rows = [row for batch in batches for row in batch]
+        for attempt in (1, 2):
+            try:
+                # The plain table insert (Core) is used rather than the ORM's bulk insert, so the
+                # rows go straight to the database driver without the ORM's per-row processing.
+                with Session() as session:
+                    session.execute(SensorLog.__table__.insert(), rows)
+                    session.commit()
+                break
+            except Exception as e:
+                if attempt == 1:
+                    logger.warning("[Sensor Log Writer] Failed to write %s sensor log(s), retrying: %s", len(rows), e)
+                    time.sleep(1)
+                else:
+                    logger.exception("[Sensor Log Writer] Failed to write %s sensor log(s) again; "
+                                     "these readings are lost: %s", len(rows), e)
+            finally:
+                # Session is a scoped_session: discard this thread's session after each attempt.
+                # Closing it also rolls back a failed transaction, so a retry starts clean.
+                Session.remove()
+        for _ in batches:
+            SENSOR_LOG_QUEUE.task_done()
+
+def queue_sensor_logs(rows):
+    """
+    Hands a cycle's SensorLog rows to the writer thread, starting the thread if needed.
+
+    Parameters:
+      rows (list): SensorLog rows as dictionaries (sensor_type, value, timestamp).
+    """
+    global SENSOR_LOG_WRITER
+    with SENSOR_LOG_WRITER_LOCK:
+        if SENSOR_LOG_WRITER is None:
+            SENSOR_LOG_WRITER = threading.Thread(target=write_sensor_logs, name="sensor-log-writer", daemon=True)
+            SENSOR_LOG_WRITER.start()
+            # Write whatever is still queued when the process exits normally.
+            atexit.register(SENSOR_LOG_QUEUE.join)
+    SENSOR_LOG_QUEUE.put(rows)
+
+# ---------------------------
+# Sensor Rule Combining Settings
+# ---------------------------
+# When several controller rules drive the same actuator (e.g., a temperature rule and a humidity
+# rule both controlling a fan), their decisions are combined and the actuator is switched at most
+# once per cycle. RULE_COMBINE_MODE decides how:
+#   - "any": the actuator is on if any of its rules wants it on (default).
+#   - "all": the actuator is on only if all of its rules want it on.
+# Any other value is refused at startup instead of silently acting like "any".
+RULE_COMBINE_MODE = os.getenv('RULE_COMBINE_MODE', 'any').lower()
+if RULE_COMBINE_MODE not in ("any", "all"):
+    raise ValueError(f"RULE_COMBINE_MODE must be 'any' or 'all', not {RULE_COMBINE_MODE!r}")
+
+# ---------------------------
+# Configuration Snapshot
+# ---------------------------
+# CONFIG_SNAPSHOT keeps the sensor configurations and controller rules (as plain rows) between
+# cycles, together with the configuration version they were loaded at. They rarely change, so
+# each cycle only reads the version number (see database.ConfigVersion) and reloads them when
+# it has changed. Devices are not part of the snapshot because every cycle updates their status.
+# "controllers" holds one SensorActuatorController per rule id, built when the rules are loaded
+# and reused by every cycle (each cycle only sets its current on/off state before deciding).
+CONFIG_SNAPSHOT = {"version": None, "sensor_configs": [], "rules": [], "controllers": {}}
+
+def load_config_snapshot(session):
+    """
+    Returns the current sensor configurations and controller rules, using CONFIG_SNAPSHOT.
+
+    Parameters:
+      session (Session): The database session of the current cycle.
+
+    Returns:
+      tuple: (sensor_configs, rules, controllers): sensor_configs and rules are lists of plain rows,
+             controllers maps each rule id to its SensorActuatorController.
+    """
+    version = session.scalar(select(ConfigVersion.version).where(ConfigVersion.id == 1))
+    # Without a version row (nothing has been changed through the ORM yet) there is nothing to
+    # compare against, so the configuration is loaded fresh every cycle.
+    if version is None or version != CONFIG_SNAPSHOT["version"]:
+        # Only the columns used by combined_task() are selected, and they are returned as plain rows
+        # (with attribute access such as sensor.sensor_name) instead of full ORM objects, since the
+        # configuration is only read; plain rows also stay valid after the session is closed.
+        sensor_configs = session.execute(
+            select(SensorConfig.id, SensorConfig.sensor_name, SensorConfig.sensor_type,
+                   SensorConfig.config_json, SensorConfig.simulate)
+        ).all()
+        rules = session.execute(
+            select(ControllerConfig.id, ControllerConfig.sensor_name, ControllerConfig.actuator_name,
+                   ControllerConfig.threshold, ControllerConfig.control_logic, ControllerConfig.hysteresis)
+            .order_by(ControllerConfig.id)
+        ).all()
+        # One controller per rule. No actuator is passed: the controllers only decide, and
+        # combined_task() switches each actuator once for all rules that control it.
+        controllers = {
+            rule.id: SensorActuatorController(
+                actuator=None,
+                threshold=rule.threshold,         # The threshold from the controller rule.
+                control_logic=rule.control_logic, # "below" or "above" logic.
+                hysteresis=rule.hysteresis if rule.hysteresis is not None else 0.5,
+            )
+            for rule in rules
+        }
+        # Forget sensor instances of sensors that have been deleted.
+        prune_sensor_instances(sensor_configs)
+        CONFIG_SNAPSHOT.update(version=version, sensor_configs=sensor_configs, rules=rules, controllers=controllers)
+        logger.debug("[combined_task] Loaded configuration version %s.", version)
+    return CONFIG_SNAPSHOT["sensor_configs"], CONFIG_SNAPSHOT["rules"], CONFIG_SNAPSHOT["controllers"]
+
+def read_sensor(sensor_conf):
+    """
+    Reads the current value of a sensor, using its cached sensor instance.
+
+    Parameters:
+      sensor_conf (SensorConfig row): The sensor configuration (needs id, sensor_type, config_json and simulate).
+
+    Returns:
+      The sensor reading (a number, or a dictionary for a DHT22).
+    """
+    return get_sensor(sensor_conf).read_value()
+
+# ---------------------------
+# Scheduled Time Cache
+# ---------------------------
+# AUTO_TIME_CACHE maps an auto_time string (e.g., "08:00") to its minute of the day (e.g., 480),
+# so each schedule is parsed only once instead of on every cycle.
+AUTO_TIME_CACHE = {}
+
+def parse_auto_time(auto_time):
+    """
+    Returns the minute of the day (hour * 60 + minute) of an "HH:MM" auto_time string,
+    using AUTO_TIME_CACHE.
+
+    Splitting the string and converting with int() is much cheaper than datetime.strptime(),
+    and a single integer is cheaper to compare than an (hour, minute) pair.
+
+    Parameters:
+      auto_time (str): The scheduled time, e.g., "08:00".
+
+    Returns:
+      int: The scheduled minute of the day (0-1439).
+
+    Raises:
+      ValueError: If auto_time is not in "HH:MM" form.
+    """
+    parsed = AUTO_TIME_CACHE.get(auto_time)
+    if parsed is None:
+        hh, mm = map(int, auto_time.split(":"))
+        parsed = AUTO_TIME_CACHE[auto_time] = hh * 60 + mm
+    return parsed
+
+@releases_session
 def combined_task():
     """
     The combined_task function performs the following steps in a single cycle:
     
     1) Read and log sensor values:
-       - For every sensor configuration (from SensorConfig), create a sensor instance.
-       - Read the sensor's value once.
-       - Print the reading for debugging.
-       - Save the reading in the SensorLog table.
+       - For every sensor configuration (from SensorConfig), get its (cached) sensor instance.
+       - Read each sensor's value once; the sensors are read in parallel by a thread pool.
+       - Log the reading (at DEBUG level) for debugging.
+       - Hand the readings to the sensor log writer thread, which saves them in the SensorLog table.
        - Also store the reading in a dictionary (sensor_values) for immediate use in automation.
        
     2) Time-based Control:
@@ -43,216 +274,380 @@ def combined_task():
        - Retrieve all controller rules from ControllerConfig.
        - For each rule, get the corresponding actuator from DeviceControl.
        - Look up the sensor reading from the sensor_values dictionary using the sensor name from the rule.
-       - Create a SensorActuatorController instance (which uses the sensor reading to decide if the actuator should toggle).
-       - Call check_and_update() with the sensor_value.
-       - Update the actuator's current status in the DeviceControl record based on the controller decision.
+       - Call decide() on the rule's SensorActuatorController (built once per configuration) with the
+         sensor reading to find out whether the rule wants the actuator on or off.
+       - Combine the decisions of all rules for the same actuator (see RULE_COMBINE_MODE), switch the
+         actuator at most once, and update its current status in the DeviceControl record.
     """
 
-    # Get the current date and time in the America/Chicago timezone.
-    now = datetime.datetime.now(ZoneInfo("America/Chicago"))
+    # Get the current date and time in the greenhouse's local timezone (America/Chicago).
+    # LOCAL_TZ is created once in database.py instead of being looked up on every cycle.
+    now = datetime.datetime.now(LOCAL_TZ)
 
-    # Dictionary to hold the latest readings for each sensor.
-    sensor_values = {}
-    
-    # ------------------------------------
-    # Step 1: Read and Log Sensor Values
-    # ------------------------------------
+    # A single database session (and transaction) is used for the whole cycle.
     with Session() as session:
-        sensor_configs = session.query(SensorConfig).all()
+        # Dictionary to hold the latest readings for each sensor.
+        sensor_values = {}
     
-    for sensor in sensor_configs:
-        try:
-            # Parse configuration from JSON, or use an empty dictionary if not provided.
-            config = json.loads(sensor.config_json) if sensor.config_json else {}
-            # Create the sensor instance. The simulate flag is used as configured.
-            sensor_instance = sensor_factory(sensor.sensor_type, config, simulate=sensor.simulate)
-            # Read the sensor value. For a DHT22, this might return a dictionary.
-            value = sensor_instance.read_value()
-            # Save the reading in our in-memory dictionary.
-            sensor_values[sensor.sensor_name] = value
-            # Log the sensor reading(s) to the database.
-            if isinstance(value, dict):
-                # If the configuration name ends with "_temp", log the temperature.
-                if sensor.sensor_name.lower().endswith("_temp"):
-                    print(f"Logging {sensor.sensor_name}: temperature = {value['temperature']}", flush=True)
-                    session.add(SensorLog(sensor_type=sensor.sensor_name, value=value["temperature"]))
-                # If the configuration name ends with "_humid", log the humidity.
-                elif sensor.sensor_name.lower().endswith("_humid"):
-                    print(f"Logging {sensor.sensor_name}: humidity = {value['humidity']}", flush=True)
-                    session.add(SensorLog(sensor_type=sensor.sensor_name, value=value["humidity"]))
+        # ------------------------------------
+        # Step 1: Read and Log Sensor Values
+        # ------------------------------------
+        # The sensor configurations and controller rules (reloaded only when the configuration changed).
+        sensor_configs, all_rules, controllers = load_config_snapshot(session)
+        # Sensor configurations by name, reused by the sensor-based rules in Step 3.
+        sensor_configs_by_name = {s.sensor_name: s for s in sensor_configs}
+        # The new SensorLog rows are collected here (as plain dictionaries) and written together.
+        log_rows = []
+
+        # Read all sensors in parallel, so the cycle waits about as long as the slowest sensor
+        # instead of the sum of all of them. Each future holds a reading or the error raised;
+        # future.result() below waits for it, so one slow or failing sensor affects only itself.
+        # All reads share one deadline (SENSOR_READ_TIMEOUT seconds from now).
+        futures = [SENSOR_READ_EXECUTOR.submit(read_sensor, sensor) for sensor in sensor_configs]
+        read_deadline = time.monotonic() + SENSOR_READ_TIMEOUT
+    
+        for sensor, future in zip(sensor_configs, futures):
+            try:
+                # Get the sensor value. For a DHT22, this might return a dictionary.
+                value = future.result(timeout=max(0, read_deadline - time.monotonic()))
+                # Save the reading in our in-memory dictionary.
+                sensor_values[sensor.sensor_name] = value
+                # Work out the log row(s) for this reading.
+                if isinstance(value, dict):
+                    # If the configuration name ends with "_temp", log the temperature.
+                    if sensor.sensor_name.lower().endswith("_temp"):
+                        rows = [(sensor.sensor_name, value["temperature"])]
+                    # If the configuration name ends with "_humid", log the humidity.
+                    elif sensor.sensor_name.lower().endswith("_humid"):
+                        rows = [(sensor.sensor_name, value["humidity"])]
+                    else:
+                        # Fallback: if the naming doesn't match, log both measurements as two rows,
+                        # named the way the "_temp"/"_humid" sensors above would be.
+                        rows = [(f"{sensor.sensor_name}_temp", value["temperature"]),
+                                (f"{sensor.sensor_name}_humid", value["humidity"])]
                 else:
-                    # Fallback: log the entire dictionary if naming doesn't match.
-                    session.add(SensorLog(sensor_type=sensor.sensor_name, value=value))
-            else:
-                # For other sensors that return a single value.
-                session.add(SensorLog(sensor_type=sensor.sensor_name, value=value))
-                print(f"[combined_task] Logged {sensor.sensor_name} reading: {value}", flush=True)
-        except Exception as e:
-            print(f"[combined_task] Error reading sensor '{sensor.sensor_name}': {e}", flush=True)
-            sensor_values[sensor.sensor_name] = None
+                    # For other sensors that return a single value.
+                    rows = [(sensor.sensor_name, value)]
+                # All rows are inserted together at the end of this step, so a value that cannot be
+                # stored (anything but a number or None) is rejected here, for this sensor only,
+                # instead of making the whole insert fail.
+                for sensor_type, reading in rows:
+                    if reading is not None and (isinstance(reading, bool) or not isinstance(reading, (int, float))):
+                        raise ValueError(f"reading {reading!r} is not a number")
+                # Every row of a cycle carries the cycle's timestamp (now), so the readings taken
+                # together share one timestamp and the per-row column default is not evaluated.
+                for sensor_type, reading in rows:
+                    log_rows.append({'sensor_type': sensor_type, 'value': reading, 'timestamp': now})
+                    logger.debug("[combined_task] Logged %s reading: %s", sensor_type, reading)
+            except FutureTimeoutError:
+                # The read is still running (or still waiting for a free thread). It cannot be
+                # interrupted, so its result is simply not used; a read that has not started yet
+                # is cancelled so it does not take up a thread.
+                future.cancel()
+                logger.error("[combined_task] Reading sensor '%s' timed out after %s s",
+                             sensor.sensor_name, SENSOR_READ_TIMEOUT)
+                sensor_values[sensor.sensor_name] = None
+            except Exception as e:
+                logger.error("[combined_task] Error reading sensor '%s': %s", sensor.sensor_name, e)
+                sensor_values[sensor.sensor_name] = None
     
-        session.commit()  # Commit the log entry to the database.
+        # Hand all of this cycle's log entries to the sensor log writer thread, which inserts
+        # them with one bulk INSERT while this cycle goes on with the device control.
+        if log_rows:
+            queue_sensor_logs(log_rows)
   
-    # -------------------------------------------
-    # Step 2: Perform Time-Based Control
-    # -------------------------------------------
-    # Open a single database session for reading and updating device controls.
-    with Session() as session:
-        # Query for devices that use time-based control.
-        devices = session.query(DeviceControl).filter_by(control_mode="time").all()
+        # -------------------------------------------
+        # Step 2: Perform Time-Based Control
+        # -------------------------------------------
+        # Load every device once; the time-based devices are handled here and the whole set
+        # is reused (by name) for the sensor-based rules in Step 3.
+        # They are sorted by id (in Python, which is free for a handful of rows, rather than with an
+        # ORDER BY in the query) so that devices are always switched in the same order.
+        # Only the columns used by Steps 2 and 3 are loaded; the per-device sensor fields
+        # (sensor_name, threshold, control_logic, hysteresis) and device_type are left out.
+        devices = session.query(DeviceControl).options(load_only(
+            DeviceControl.device_name, DeviceControl.control_mode, DeviceControl.mode,
+            DeviceControl.current_status, DeviceControl.auto_time, DeviceControl.auto_duration,
+            DeviceControl.auto_enabled, DeviceControl.last_auto_on, DeviceControl.gpio_pin,
+            DeviceControl.simulate)).all()
+        devices.sort(key=lambda device: device.id)
+        devices_by_name = {device.device_name: device for device in devices}
+
+        # The current minute of the day, compared with each device's scheduled minute.
+        now_minute = now.hour * 60 + now.minute
 
-        # Process each device control record.
-        for control in devices:
+        # Only the devices that use time-based control are processed in this step. The devices are
+        # filtered here rather than in SQL because Step 3 needs the full list anyway.
+        time_devices = [device for device in devices if device.control_mode == "time"]
+        if not time_devices:
+            logger.debug("[Time Control] No devices use time-based control.")
+
+        # Process each device control record that uses time-based control.
+        for control in time_devices:
             try:
                 # Parse the scheduled auto_time from the device record.
                 if not control.auto_time:
                     # Skip if auto_time is not set, auto is not enabled or device is in manual mode.
                     continue
                 if control.auto_enabled == False:
-                    print(f"[Time Control] Actuator '{control.device_name}' does not have auto enabled.", flush=True)
+                    logger.debug("[Time Control] Actuator '%s' does not have auto enabled.", control.device_name)
                     continue
                 if control.mode == "manual":
-                    print(f"[Time Control] Actuator '{control.device_name}' is in manual.", flush=True)
+                    logger.debug("[Time Control] Actuator '%s' is in manual.", control.device_name)
                     continue
-                # Convert auto_time (string, e.g., "08:00") to a time object.
-                scheduled_time = datetime.datetime.strptime(control.auto_time, "%H:%M").time()
-                current_time = now.time()
+                # Scheduled minute of the day of auto_time (string, e.g., "08:00"), parsed once per value.
+                # A malformed value raises ValueError and is reported by the except block below.
+                scheduled_minute = parse_auto_time(control.auto_time)
+                # When the device was last turned on automatically. Some databases (e.g., SQLite)
+                # return naive timestamps; those are local greenhouse time.
+                last_auto_on = control.last_auto_on
+                if last_auto_on is not None and last_auto_on.tzinfo is None:
+                    last_auto_on = last_auto_on.replace(tzinfo=LOCAL_TZ)
 
                 # Check if the current time matches the scheduled time.
-                # NOTE: This simple check means that during the entire minute that current_time matches,
-                # the condition will be true. Consider adding a guard to only trigger once.
-                if current_time.hour == scheduled_time.hour and current_time.minute == scheduled_time.minute:
+                # The job runs twice a minute, so the scheduled minute is seen twice; it is only acted on
+                # the first time (last_auto_on already falls in this minute the second time).
+                if now_minute == scheduled_minute:
+                    if last_auto_on is not None and last_auto_on.replace(second=0, microsecond=0) == now.replace(second=0, microsecond=0):
+                        logger.debug("[Time Control] %s was already switched on this minute.", control.device_name)
+                        continue
                     # If the device is not yet on, turn it on.
                     if not control.current_status:
                         control.current_status = True
                         control.last_auto_on = now
-                        print(f"[Time Control] Turning ON {control.device_name} at {now.strftime('%H:%M')}", flush=True)
+                        logger.info("[Time Control] Turning ON %s at %02d:%02d", control.device_name, now.hour, now.minute)
                         if control.gpio_pin is not None:
-                            actuator = Actuator(control.gpio_pin, control.device_name, simulate=control.simulate)
+                            actuator = get_actuator(control.gpio_pin, control.device_name, control.simulate)
                             actuator.turn_on()
                     else:
                         # Device is already on; do nothing or log that it remains on.
-                        print(f"[Time Control] {control.device_name} is already ON.", flush=True)
+                        logger.debug("[Time Control] %s is already ON.", control.device_name)
                 else:
                     # If the device is on, check if it should now be turned off based on auto_duration.
-                    if control.current_status and control.last_auto_on:
+                    if control.current_status and last_auto_on:
                         # Calculate elapsed time in minutes.
-                        elapsed = (now - control.last_auto_on).total_seconds() / 60.0
+                        elapsed = (now - last_auto_on).total_seconds() / 60.0
                         if elapsed >= control.auto_duration:
                             control.current_status = False
-                            print(f"[Time Control] Turning OFF {control.device_name} after {control.auto_duration} min", flush=True)
+                            logger.info("[Time Control] Turning OFF %s after %s min", control.device_name, control.auto_duration)
                             if control.gpio_pin is not None:
-                                actuator = Actuator(control.gpio_pin, control.device_name, simulate=control.simulate)
+                                actuator = get_actuator(control.gpio_pin, control.device_name, control.simulate)
                                 actuator.turn_off()
             except Exception as e:
                 # Log any errors encountered for this device.
-                print(f"[Time Control] Error processing {control.device_name}: {e}", flush=True)
-
-        # Commit all updates to the database.
-        session.commit()
+                logger.exception("[Time Control] Error processing %s: %s", control.device_name, e)
       
-    # -------------------------------------------
-    # Step 3: Perform Sensor-Based Control
-    # -------------------------------------------
-    # Retrieve all controller rules (automation rules linking a sensor to an actuator)
-    with Session() as session:
-        rules = session.query(ControllerConfig).order_by(ControllerConfig.id).all()
-    
-    # Loop through each controller rule.
-    for rule in rules:
-        try:
-            # Retrieve the corresponding actuator device from DeviceControl.
-            with Session() as session:
-                actuator_device = session.query(DeviceControl).filter_by(device_name=rule.actuator_name).first()
-            if not actuator_device:
-                print(f"[combined_task] Actuator '{rule.actuator_name}' not found for rule ID {rule.id}.", flush=True)
-                continue
-            if actuator_device.gpio_pin is None:
-                print(f"[combined_task] Actuator '{rule.actuator_name}' has no GPIO pin set for rule ID {rule.id}.", flush=True)
-                continue
-            if actuator_device.auto_enabled == False:
-                print(f"[combined_task] Actuator '{rule.actuator_name}' does not have auto enabled.", flush=True)
-                continue
-            if actuator_device.mode == "manual":
-                print(f"[combined_task] Actuator '{rule.actuator_name}' is in manual.", flush=True)
-                continue  
-            # Only process sensor-based rules
-            # If the actuator's control_mode is not set to "sensor", skip processing this rule.
-            if actuator_device.control_mode.lower() != "sensor":
-                print(f"[combined_task] Skipping rule ID {rule.id}: Device '{actuator_device.device_name}' is set to '{actuator_device.control_mode}' control (not sensor-based).", flush=True)
-                continue
+        # -------------------------------------------
+        # Step 3: Perform Sensor-Based Control
+        # -------------------------------------------
+        # The controller rules (automation rules linking a sensor to an actuator) come from the
+        # configuration snapshot loaded in Step 1. The linked devices and sensor configurations were
+        # loaded in Steps 1 and 2, so they are looked up in devices_by_name and sensor_configs_by_name
+        # rather than queried again.
+        # A rule can only act on a device in "sensor" control mode, using a sensor that exists, so the
+        # rules are skipped entirely when there are no sensor readings (no sensors, or every read
+        # failed, e.g., during a hardware outage) or no sensor-controlled devices.
+        rules = []
+        if not any(value is not None for value in sensor_values.values()):
+            logger.debug("[combined_task] No sensor readings this cycle; skipping controller rules.")
+        elif not any((device.control_mode or "").lower() == "sensor" for device in devices):
+            logger.debug("[combined_task] No sensor-controlled devices; skipping controller rules.")
+        else:
+            rules = all_rules
+
+        # The decisions of the rules, grouped by actuator name: {actuator_name: [True, False, ...]}.
+        # The actuators are switched once all rules have been evaluated (see below).
+        decisions_by_actuator = defaultdict(list)
     
-            # Retrieve the sensor reading from the sensor_values dictionary (populated in Step 1).
-            if rule.sensor_name in sensor_values:
-                sensor_value = sensor_values[rule.sensor_name]
-            else:
-                print(f"[combined_task] No recent reading found for '{rule.sensor_name}'. Check for name mismatch.", flush=True)
-                continue
+        # Loop through each controller rule.
+        for rule in rules:
+            try:
+                # Retrieve the sensor reading from the sensor_values dictionary (populated in Step 1).
+                # This is checked first, so a rule whose sensor gave no reading is dropped before any
+                # other lookup.
+                sensor_value = sensor_values.get(rule.sensor_name)
+                if sensor_value is None:
+                    if rule.sensor_name not in sensor_values:
+                        logger.warning("[combined_task] No recent reading found for '%s'. Check for name mismatch.", rule.sensor_name)
+                    else:
+                        # The read failed in Step 1 (the error was logged there); leave the actuator as it is.
+                        logger.debug("[combined_task] Skipping rule ID %s: no reading from '%s' this cycle.", rule.id, rule.sensor_name)
+                    continue
+
+                # The corresponding actuator device from DeviceControl (loaded in Step 2).
+                actuator_device = devices_by_name.get(rule.actuator_name)
+                if not actuator_device:
+                    logger.warning("[combined_task] Actuator '%s' not found for rule ID %s.", rule.actuator_name, rule.id)
+                    continue
+                if actuator_device.gpio_pin is None:
+                    logger.warning("[combined_task] Actuator '%s' has no GPIO pin set for rule ID %s.", rule.actuator_name, rule.id)
+                    continue
+                if actuator_device.auto_enabled == False:
+                    logger.debug("[combined_task] Actuator '%s' does not have auto enabled.", rule.actuator_name)
+                    continue
+                if actuator_device.mode == "manual":
+                    logger.debug("[combined_task] Actuator '%s' is in manual.", rule.actuator_name)
+                    continue  
+                # Only process sensor-based rules
+                # If the actuator's control_mode is not set to "sensor", skip processing this rule.
+                if actuator_device.control_mode.lower() != "sensor":
+                    logger.debug("[combined_task] Skipping rule ID %s: Device '%s' is set to '%s' control (not sensor-based).",
+                                 rule.id, actuator_device.device_name, actuator_device.control_mode)
+                    continue
     
-            # Query the sensor configuration from the database using the sensor name.
-            with Session() as session:
-                sensor_config = session.query(SensorConfig).filter_by(sensor_name=rule.sensor_name).first()
-            if not sensor_config:
-                print(f"[combined_task] Sensor configuration for '{rule.sensor_name}' not found.", flush=True)
-                continue
+                # The sensor configuration linked to this rule (loaded in Step 1).
+                sensor_config = sensor_configs_by_name.get(rule.sensor_name)
+                if not sensor_config:
+                    logger.warning("[combined_task] Sensor configuration for '%s' not found.", rule.sensor_name)
+                    continue
     
-            # Parse the JSON configuration for the sensor.
-            config = json.loads(sensor_config.config_json) if sensor_config.config_json else {}
-            # Check the "sensor-hardware" key in the configuration to see if it is a DHT22 sensor.
-            sensor_hardware = config.get("sensor_hardware", "").lower()
+                # The parsed JSON configuration for the sensor (cached between cycles).
+                config = get_parsed_config(sensor_config)
+                # Check the "sensor-hardware" key in the configuration to see if it is a DHT22 sensor.
+                sensor_hardware = config.get("sensor_hardware", "").lower()
     
-            # Determine the measurement key to use:
-            # If the sensor is a DHT22 (per the JSON config), then sensor_value is expected to be a dict.
-            # We use the controller rule's sensor_type field to decide:
-            #   - If rule.sensor_type is "temperature", then use "temperature"
-            #   - If rule.sensor_type is "humidity", then use "humidity"
-            if sensor_hardware == "dht22":
-                # Decide which measurement to extract.
-                if sensor_config.sensor_type.lower() == "temperature":
-                    measurement_key = "temperature"
-                elif sensor_config.sensor_type.lower() == "humidity":
-                    measurement_key = "humidity"
-                else:
-                    # Default to temperature if rule.sensor_type isn't set appropriately.
-                    measurement_key = "temperature"
-                # Check that sensor_value is a dict and extract the desired measurement.
-                if isinstance(sensor_value, dict):
-                    value_to_use = sensor_value.get(measurement_key)
-                    if value_to_use is None:
-                        print(f"[combined_task] Measurement key '{measurement_key}' not found in sensor reading for '{rule.sensor_name}'.", flush=True)
+                # Determine the measurement key to use:
+                # If the sensor is a DHT22 (per the JSON config), then sensor_value is expected to be a dict.
+                # We use the controller rule's sensor_type field to decide:
+                #   - If rule.sensor_type is "temperature", then use "temperature"
+                #   - If rule.sensor_type is "humidity", then use "humidity"
+                if sensor_hardware == "dht22":
+                    # Decide which measurement to extract.
+                    if sensor_config.sensor_type.lower() == "temperature":
+                        measurement_key = "temperature"
+                    elif sensor_config.sensor_type.lower() == "humidity":
+                        measurement_key = "humidity"
+                    else:
+                        # Default to temperature if rule.sensor_type isn't set appropriately.
+                        measurement_key = "temperature"
+                    # Check that sensor_value is a dict and extract the desired measurement.
+                    if isinstance(sensor_value, dict):
+                        value_to_use = sensor_value.get(measurement_key)
+                        if value_to_use is None:
+                            logger.warning("[combined_task] Measurement key '%s' not found in sensor reading for '%s'.", measurement_key, rule.sensor_name)
+                            continue
+                    else:
+                        logger.warning("[combined_task] Expected dict for DHT22 sensor '%s', but got %s.", rule.sensor_name, sensor_value)
                         continue
                 else:
-                    print(f"[combined_task] Expected dict for DHT22 sensor '{rule.sensor_name}', but got {sensor_value}.", flush=True)
-                    continue
-            else:
-                # For non-DHT22 sensors, sensor_value is assumed to be a single numeric value.
-                value_to_use = sensor_value
+                    # For non-DHT22 sensors, sensor_value is assumed to be a single numeric value.
+                    value_to_use = sensor_value
 
-            # Create an actuator instance using the device's simulate flag.
-            actuator = Actuator(actuator_device.gpio_pin, actuator_device.device_name, simulate=actuator_device.simulate)
+                # The rule's controller (built with the configuration snapshot), given the
+                # actuator's current on/off state. The actuator is switched below, once for all
+                # rules that control it.
+                controller = controllers[rule.id]
+                controller.active = actuator_device.current_status
     
-            # Create an instance of SensorActuatorController.
-            # Pass the measurement parameter only if sensor_hardware is DHT22; otherwise, use "value".
-            controller = SensorActuatorController(
-                actuator=actuator,         # The actuator device instance.
-                threshold=rule.threshold,         # The threshold from the controller rule.
-                control_logic=rule.control_logic, # "below" or "above" logic.
-                hysteresis=rule.hysteresis if rule.hysteresis is not None else 0.5,
-                initial_active=actuator_device.current_status
-            )
+                # Call decide with the value (either extracted from the dict or a numeric value).
+                decisions_by_actuator[rule.actuator_name].append(controller.decide(value_to_use))
     
-            # Call check_and_update with the value (either extracted from the dict or a numeric value).
-            controller.check_and_update(value_to_use)
-    
-            # Update the actuator's status in the database to reflect the controller decision.
-            with Session() as session:
-                device_to_update = session.query(DeviceControl).filter_by(device_name=rule.actuator_name).first()
-                if device_to_update:
-                    device_to_update.current_status = controller.active
-                    session.commit()
-    
-        except Exception as e:
-            print(f"[combined_task] Error processing sensor-based rule ID {rule.id}: {e}", flush=True)
+            except Exception as e:
+                logger.exception("[combined_task] Error processing sensor-based rule ID %s: %s", rule.id, e)
+
+        # Switch each actuator at most once, based on the combined decisions of its rules.
+        for actuator_name, decisions in decisions_by_actuator.items():
+            actuator_device = devices_by_name[actuator_name]
+            try:
+                wanted = all(decisions) if RULE_COMBINE_MODE == "all" else any(decisions)
+                if wanted == actuator_device.current_status:
+                    continue
+                # Get the pooled actuator instance, using the device's simulate flag.
+                actuator = get_actuator(actuator_device.gpio_pin, actuator_device.device_name, actuator_device.simulate)
+                if wanted:
+                    logger.info("[combined_task] Turning ON '%s' (rule decisions: %s)", actuator_name, decisions)
+                    actuator.turn_on()
+                else:
+                    logger.info("[combined_task] Turning OFF '%s' (rule decisions: %s)", actuator_name, decisions)
+                    actuator.turn_off()
+                # The device was loaded in this session, so the change is saved by the commit below.
+                actuator_device.current_status = wanted
+            except Exception as e:
+                logger.exception("[combined_task] Error switching actuator '%s': %s", actuator_name, e)
+
+        # Commit all device status updates in a single transaction. They are written here rather
+        # than by the writer thread because the next cycle reads them back.
+        # If no device switched, there is nothing to write, and the session is simply closed
+        # without a commit.
+        if session.dirty:
+            session.commit()
+
+
+
+@releases_session
+def archive_sensor_logs():
+    """
+    Moves old sensor readings out of the database into a compressed Parquet file.
+
+    At one reading per sensor every cycle, the sensor_logs table grows without bound, which
+    slows every query against it. This job (scheduled nightly) keeps the table small:
+      1) Stream all SensorLog rows older than SENSOR_LOG_RETENTION_DAYS, 10,000 at a time,
+         into a zstd-compressed Parquet file in SENSOR_LOG_ARCHIVE_DIR
+         (sensor_logs_<date>_<time>.parquet). The file can be read later with pandas or DuckDB.
+      2) Only once the file has been written completely, delete the archived rows.
+
+    Timestamps are stored in UTC in the archive. Requires the optional pyarrow package;
+    without it the job does nothing (and nothing is deleted).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.warning("[archive_sensor_logs] pyarrow is not installed; skipping sensor log archiving.")
+        return
+
+    now = datetime.datetime.now(LOCAL_TZ)
+    cutoff = now - datetime.timedelta(days=SENSOR_LOG_RETENTION_DAYS)
+    os.makedirs(SENSOR_LOG_ARCHIVE_DIR, exist_ok=True)
+    archive_path = os.path.join(SENSOR_LOG_ARCHIVE_DIR, f"sensor_logs_{now:%Y-%m-%d_%H%M%S}.parquet")
+    # Write to a temporary name first so a partial file is never mistaken for a finished archive.
+    temp_path = archive_path + ".tmp"
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("sensor_type", pa.string()),
+        ("value", pa.float64()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+    ])
+
+    with Session() as session:
+        result = session.execute(
+            select(SensorLog.id, SensorLog.sensor_type, SensorLog.value, SensorLog.timestamp)
+            .where(SensorLog.timestamp < cutoff)
+            .order_by(SensorLog.id)
+            .execution_options(yield_per=10_000)
+        )
+
+        writer = None
+        max_id = None
+        row_count = 0
+        try:
+            for batch in result.partitions():
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, schema, compression="zstd")
+                # Some databases (e.g., SQLite) return naive timestamps; those are local greenhouse time.
+                timestamps = [ts if ts is None or ts.tzinfo else ts.replace(tzinfo=LOCAL_TZ) for ts in (row.timestamp for row in batch)]
+                writer.write_table(pa.Table.from_arrays([
+                    pa.array([row.id for row in batch], pa.int64()),
+                    pa.array([row.sensor_type for row in batch], pa.string()),
+                    pa.array([row.value for row in batch], pa.float64()),
+                    pa.array(timestamps, pa.timestamp("us", tz="UTC")),
+                ], schema=schema))
+                max_id = batch[-1].id
+                row_count += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if max_id is None:
+            logger.info("[archive_sensor_logs] No sensor logs old enough to archive.")
+            return
+
+        os.replace(temp_path, archive_path)
+        # Delete exactly the rows that were written to the archive.
+        session.execute(delete(SensorLog).where(SensorLog.id <= max_id, SensorLog.timestamp < cutoff))
+        session.commit()
+    logger.info("[archive_sensor_logs] Archived %d sensor log(s) to %s", row_count, archive_path)
 
 
 # -------------------------------------------
@@ -264,16 +659,30 @@ if __name__ == "__main__":
     This ensures that each sensor is read exactly once per cycle and the same reading is used
     for both logging and automation control.
     """
+    # Configure logging before anything else is imported, so this configuration is the one that
+    # applies (logging.basicConfig() calls made later by imported modules then have no effect).
+    configure_logging()
     # Import the Flask app instance from app.py.
     from app import app
-    # Import the BackgroundScheduler to schedule tasks.
-    from apscheduler.schedulers.background import BackgroundScheduler
-    import atexit  # For graceful shutdown of the scheduler
+    # Import the job store that keeps the job schedule in the database.
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    from database import engine
     
     # Create a BackgroundScheduler instance.
-    scheduler = BackgroundScheduler()
-    # Add the combined_task to the scheduler to run every 30 seconds (adjust as needed).
-    scheduler.add_job(func=combined_task, trigger="interval", seconds=30)
+    # The jobs are stored in the application database so they survive restarts; missed runs are
+    # merged into one (coalesce), runs more than 30 seconds late are skipped, and a job never
+    # runs twice at the same time (max_instances).
+    scheduler = BackgroundScheduler(jobstores={'default': SQLAlchemyJobStore(engine=engine)},
+                                    job_defaults={'coalesce': True, 'misfire_grace_time': 30, 'max_instances': 1})
+    # Add a job to run combined_task() every 30 seconds, at :00 and :30 of each minute.
+    # A cron trigger keeps the runs anchored to the clock, so the time-based control sees every
+    # minute exactly twice (an interval trigger drifts and can skip a scheduled minute).
+    # Fixed ids with replace_existing=True update the stored jobs instead of adding duplicates.
+    scheduler.add_job(func=combined_task, trigger="cron", second="0,30",
+                      id="combined_task", replace_existing=True)
+    # Archive old sensor logs every night at 3 AM (or within an hour after, if the scheduler was down).
+    scheduler.add_job(func=archive_sensor_logs, trigger="cron", hour=3,
+                      id="archive_sensor_logs", replace_existing=True, misfire_grace_time=3600)
     # Start the scheduler.
     scheduler.start()
     
@@ -6,7 +6,8 @@ This script starts the background scheduler that runs your automation tasks.
 It is intended to run as a separate process alongside your Gunicorn-served Flask app.
 
 It uses APScheduler to schedule the combined_task() function (which reads sensors and applies automation)
-at a specified interval (e.g., every 30 seconds).
+at a specified interval (e.g., every 30 seconds), and archive_sensor_logs() (which moves old sensor
+readings out of the database) once a night.
 
 Signal handlers are registered so that the scheduler can shut down gracefully
 when receiving a termination signal (SIGINT or SIGTERM).
@@ -16,19 +17,70 @@ Usage:
       python3 scheduler.py
 """
 
-import time            # For sleep in the infinite loop
 import signal          # For handling system signals (e.g., SIGINT, SIGTERM)
 import sys             # For exiting the process gracefully
 import atexit          # For handling exit and releasing GPIO
+import logging         # For configuring log output of the scheduled tasks
+import logging.handlers  # For buffering log output (MemoryHandler)
 import RPi.GPIO as GPIO  # For cleanup of GPIO on exit
-from apscheduler.schedulers.background import BackgroundScheduler  # Scheduler for background jobs
-from main import combined_task  # Import the combined_task function from your main module
+from apscheduler.schedulers.blocking import BlockingScheduler  # Scheduler that runs in the main thread
+from apscheduler.executors.pool import ThreadPoolExecutor     # Worker threads that run the jobs
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore  # Keeps the job schedule in the database
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR  # Job-finished events
+from database import engine  # The application's database engine (also used for the job store)
+from main import combined_task, archive_sensor_logs  # Import the scheduled tasks from your main module
 
-# Create an instance of BackgroundScheduler.
-scheduler = BackgroundScheduler()
+# Configure the logging module to output messages at the INFO level and above.
+# Set this to logging.DEBUG to also see every sensor reading and controller check.
+# Messages are collected in memory and written out together once a job has finished (see
+# flush_log_buffer() below), instead of one console/journal write per message. Errors, or a
+# full buffer of 100 messages, are written out immediately.
+# Messages logged between jobs (e.g., by the sensor log writer thread, or by the scheduler while
+# shutting down) wait for the next flush. flushOnClose writes out whatever is still buffered when
+# logging shuts down at exit, after the other exit handlers (such as the writer's final drain) ran.
+stream_handler = logging.StreamHandler()
+stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_buffer = logging.handlers.MemoryHandler(capacity=100, flushLevel=logging.ERROR, target=stream_handler,
+                                            flushOnClose=True)
+logging.basicConfig(level=logging.INFO, handlers=[log_buffer])
 
-# Add a job to run combined_task() every 30 seconds.
-scheduler.add_job(func=combined_task, trigger="interval", seconds=30)
+# Create an instance of BlockingScheduler.
+# This process does nothing but run the scheduled jobs, so the scheduler runs in the main thread
+# (sleeping until the next job is due) instead of in a background thread next to a busy-wait loop.
+# Only two jobs exist, so two worker threads are enough (APScheduler's default is 10).
+# The jobs are stored in the application database (table "apscheduler_jobs"), so after a restart
+# the scheduler knows when each job last ran instead of starting from scratch.
+# Job defaults:
+#   - coalesce: a backlog of missed runs (e.g., after a restart) is merged into a single run.
+#   - misfire_grace_time: a run that is up to 30 seconds late still happens; later ones are skipped.
+#   - max_instances: a job never runs twice at the same time, even if one run takes too long.
+scheduler = BlockingScheduler(jobstores={'default': SQLAlchemyJobStore(engine=engine)},
+                              executors={'default': ThreadPoolExecutor(2)},
+                              job_defaults={'coalesce': True, 'misfire_grace_time': 30, 'max_instances': 1})
+
+# Add a job to run combined_task() every 30 seconds, at :00 and :30 of each minute.
+# A cron trigger keeps the runs anchored to the clock, so the time-based control sees every
+# minute exactly twice (an interval trigger drifts and can skip a scheduled minute).
+# Each job has a fixed id and replace_existing=True, so the stored job is updated on every start
+# instead of a duplicate being added.
+scheduler.add_job(func=combined_task, trigger="cron", second="0,30",
+                  id="combined_task", replace_existing=True)
+
+# Add a job to archive old sensor logs every night at 3 AM.
+# If the scheduler was down at 3 AM, the archive still runs when it starts within the next hour.
+scheduler.add_job(func=archive_sensor_logs, trigger="cron", hour=3,
+                  id="archive_sensor_logs", replace_existing=True, misfire_grace_time=3600)
+
+def flush_log_buffer(event):
+    """
+    Writes out the buffered log messages after every job run (successful or not).
+
+    Parameters:
+      event (JobExecutionEvent): The APScheduler event for the finished job (not used here).
+    """
+    log_buffer.flush()
+
+scheduler.add_listener(flush_log_buffer, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
 
 def shutdown_handler(signum, frame):
     """
@@ -46,14 +98,10 @@ def shutdown_handler(signum, frame):
 signal.signal(signal.SIGINT, shutdown_handler)
 signal.signal(signal.SIGTERM, shutdown_handler)
 
-# Start the scheduler.
-scheduler.start()
-print("Scheduler started. Press Ctrl+C to exit.")
-
 # Cleanup all GPIO on exit
 atexit.register(GPIO.cleanup)
 
-# Block the main thread so the process doesn't exit.
-# This loop keeps the script running indefinitely, checking for shutdown signals.
-while True:
-    time.sleep(1)
+# Start the scheduler.
+# start() blocks the main thread and keeps the process running until a shutdown signal is received.
+print("Scheduler started. Press Ctrl+C to exit.")
+scheduler.start()
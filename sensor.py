@@ -16,9 +16,13 @@ For real sensors, you would implement the code to read from the actual hardware.
 """
 
 import random       # Used to generate random sensor readings in simulation mode
+import os           # For loading the 1-Wire kernel modules (DS18B20 sensors)
+import glob         # For finding DS18B20 sensor folders on the 1-Wire bus
 import json         # For parsing JSON configuration strings from the database
+import types        # For read-only views of cached configurations (MappingProxyType)
 from abc import ABC, abstractmethod  # For creating an abstract base class (BaseSensor)
 import time         # For adding delays when reading sensors (e.g., retries)
+import threading    # For serializing DHT22 reads when sensors are read in parallel
 
 # ---------------------------
 # Global Cache for Sensor Readings
@@ -32,6 +36,81 @@ import time         # For adding delays when reading sensors (e.g., retries)
 SENSOR_CACHE = {}
 # CACHE_DURATION defines how long (in seconds) a cached reading remains valid.
 CACHE_DURATION = 45.0
+# SENSOR_CACHE_LOCK makes sure only one thread reads a DHT22 at a time. When sensors are read in
+# parallel, the temperature and humidity sensors sharing one DHT22 would otherwise both miss the
+# cache and access the same pin at once; with the lock, the second one gets the cached reading.
+SENSOR_CACHE_LOCK = threading.Lock()
+
+# ---------------------------
+# Parsed Sensor Configuration Cache
+# ---------------------------
+# PARSED_CONFIG_CACHE maps a SensorConfig id to (raw config_json string, parsed configuration).
+# Sensor configurations rarely change, so each one is parsed from JSON only when its text changes
+# instead of on every scheduler cycle or web request.
+PARSED_CONFIG_CACHE = {}
+
+def get_parsed_config(sensor_conf):
+    """
+    Returns the parsed config_json of a SensorConfig record, using PARSED_CONFIG_CACHE.
+
+    The cached entry is reused as long as the stored JSON text is unchanged; otherwise the
+    text is parsed again and the cache is updated. An empty config_json gives an empty configuration.
+
+    Parameters:
+      sensor_conf (SensorConfig row): The sensor configuration (needs id and config_json).
+
+    Returns:
+      Mapping: A read-only view of the parsed configuration (it is shared between callers,
+               so it must not be modified).
+    """
+    raw = sensor_conf.config_json
+    cached = PARSED_CONFIG_CACHE.get(sensor_conf.id)
+    if cached is not None and cached[0] == raw:
+        return cached[1]
+    parsed = types.MappingProxyType(json.loads(raw) if raw else {})
+    PARSED_CONFIG_CACHE[sensor_conf.id] = (raw, parsed)
+    return parsed
+
+# ---------------------------
+# Sensor Instance Cache
+# ---------------------------
+# SENSOR_INSTANCES maps a SensorConfig id to (settings the sensor was built with, sensor instance).
+# Creating a sensor for real hardware can be slow (e.g., a DS18B20 loads kernel modules and scans
+# the 1-Wire bus), so each sensor object is created once and reused until its type, configuration
+# or simulation flag changes.
+SENSOR_INSTANCES = {}
+
+def get_sensor(sensor_conf):
+    """
+    Returns the cached sensor instance for a SensorConfig record, creating it when needed.
+
+    Parameters:
+      sensor_conf (SensorConfig row): The sensor configuration (needs id, sensor_type, config_json and simulate).
+
+    Returns:
+      BaseSensor: The sensor instance (see sensor_factory()).
+    """
+    settings = (sensor_conf.sensor_type, sensor_conf.config_json, sensor_conf.simulate)
+    cached = SENSOR_INSTANCES.get(sensor_conf.id)
+    if cached is not None and cached[0] == settings:
+        return cached[1]
+    # Parsed configuration (cached between cycles), or an empty one if not provided.
+    config = get_parsed_config(sensor_conf)
+    sensor_instance = sensor_factory(sensor_conf.sensor_type, config, simulate=sensor_conf.simulate)
+    SENSOR_INSTANCES[sensor_conf.id] = (settings, sensor_instance)
+    return sensor_instance
+
+def prune_sensor_instances(sensor_configs):
+    """
+    Removes cached sensor instances whose SensorConfig record no longer exists.
+
+    Parameters:
+      sensor_configs (list): All current SensorConfig records.
+    """
+    current_ids = {sensor_conf.id for sensor_conf in sensor_configs}
+    for sensor_id in list(SENSOR_INSTANCES):
+        if sensor_id not in current_ids:
+            del SENSOR_INSTANCES[sensor_id]
 
 def read_dht22_with_cache(sensor, pin):
     """
@@ -50,28 +129,29 @@ def read_dht22_with_cache(sensor, pin):
         - humidity: The humidity percentage.
         - temperature_c: The temperature in Celsius.
     """
-    # Create a unique key for caching, e.g., "dht22_4" for a DHT22 sensor on GPIO pin 4.
-    cache_key = f"dht22_{pin}"
-    # Get the current time in seconds.
-    current_time = time.time()
-    # Check if we already have a cached reading for this sensor.
-    if cache_key in SENSOR_CACHE:
-        cached = SENSOR_CACHE[cache_key]
-        # If the cached reading is still within the valid duration, return it.
-        if current_time - cached["timestamp"] < CACHE_DURATION:
-            return cached["humidity"], cached["temperature_c"]
-    # If no valid cached reading exists, perform a new sensor read.
-    import Adafruit_DHT
-    # Use Adafruit_DHT.read_retry to attempt reading from the sensor.
-    humidity, temperature_c = Adafruit_DHT.read_retry(sensor, pin)
-    # Update the cache with the new reading along with the current timestamp.
-    SENSOR_CACHE[cache_key] = {
-        "timestamp": current_time,
-        "humidity": humidity,
-        "temperature_c": temperature_c
-    }
-    # Return the new reading.
-    return humidity, temperature_c
+    with SENSOR_CACHE_LOCK:
+        # Create a unique key for caching, e.g., "dht22_4" for a DHT22 sensor on GPIO pin 4.
+        cache_key = f"dht22_{pin}"
+        # Get the current time in seconds.
+        current_time = time.time()
+        # Check if we already have a cached reading for this sensor.
+        if cache_key in SENSOR_CACHE:
+            cached = SENSOR_CACHE[cache_key]
+            # If the cached reading is still within the valid duration, return it.
+            if current_time - cached["timestamp"] < CACHE_DURATION:
+                return cached["humidity"], cached["temperature_c"]
+        # If no valid cached reading exists, perform a new sensor read.
+        import Adafruit_DHT
+        # Use Adafruit_DHT.read_retry to attempt reading from the sensor.
+        humidity, temperature_c = Adafruit_DHT.read_retry(sensor, pin)
+        # Update the cache with the new reading along with the current timestamp.
+        SENSOR_CACHE[cache_key] = {
+            "timestamp": current_time,
+            "humidity": humidity,
+            "temperature_c": temperature_c
+        }
+        # Return the new reading.
+        return humidity, temperature_c
 
 # ---------------------------
 # BaseSensor Abstract Class
@@ -117,7 +197,6 @@ class TemperatureSensor(BaseSensor):
                     raise ValueError("DHT22 sensor requires a 'pin' configuration.")
             else:
                 # For DS18B20 sensors (or other temperature sensors), set up 1-Wire interface.
-                import os, glob
                 os.system('modprobe w1-gpio')
                 os.system('modprobe w1-therm')
                 base_dir = '/sys/bus/w1/devices/'
@@ -140,7 +219,6 @@ class TemperatureSensor(BaseSensor):
         else:
             if self.sensor_hardware == "dht22":
                 # For DHT22, use our caching mechanism to get the reading.
-                import Adafruit_DHT
                 humidity, temperature_c = read_dht22_with_cache(self.sensor, self.pin)
                 if temperature_c is None:
                     raise Exception("Failed to read temperature from DHT22 sensor.")
@@ -208,7 +286,6 @@ class HumiditySensor(BaseSensor):
             return random.uniform(40, 70)
         else:
             if self.sensor_hardware == "dht22":
-                import Adafruit_DHT
                 # Use the caching mechanism to get the sensor reading.
                 humidity, _ = read_dht22_with_cache(self.sensor, self.pin)
                 if humidity is None: